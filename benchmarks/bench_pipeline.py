@@ -0,0 +1,92 @@
+# python -m benchmarks.bench_pipeline
+from oa_utils import Pipeline, is_even, square
+from operator import add
+from multiprocessing import Pool
+from typing import Callable
+import functools
+import pickle
+import timeit
+
+def report(label: str, fn: Callable[[], object], number: int = 1, repeat: int = 3, unit: str = "ms") -> float:
+    seconds = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    print(f"{label:<50} {seconds * scale:10.3f} {unit}")
+    return seconds
+
+def bench_extend() -> None:
+    """Growing a pipeline one part at a time copies everything each time (quadratic),
+    while passing all the parts to a single *extend* copies once (linear)."""
+    print("== extend ==")
+    for parts in (1_000, 2_000, 4_000):
+        chunks = [range(10)] * parts
+
+        def extend_in_loop() -> Pipeline[int]:
+            p: Pipeline[int] = Pipeline()
+            for chunk in chunks:
+                p = p.extend(chunk)
+            return p
+
+        report(f"extend in loop ({parts} parts)", extend_in_loop)
+        report(f"extend once ({parts} parts)", lambda: Pipeline[int]().extend(*chunks))
+
+def bench_concat() -> None:
+    print("== concat ==")
+    p = Pipeline(range(1_000_000))
+    other = list(range(1_000))
+    report("p + list", lambda: p + other, number=10)
+    report("list + p", lambda: other + p, number=10)
+    report("p.insert_at(n // 2, list)", lambda: p.insert_at(500_000, other), number=10)
+    report("p * 3", lambda: p * 3, number=10)
+
+def bench_slicing() -> None:
+    print("== slicing ==")
+    p = Pipeline(range(1_000_000))
+    report("p.slice(1000, 500_000)", lambda: p.slice(1000, 500_000), number=10)
+    report("p.take(len(p)) (shared)", lambda: p.take(len(p)), number=10)
+    report("p.drop(1000)", lambda: p.drop(1000), number=10)
+    report("p.reverse()", lambda: p.reverse(), number=10)
+
+def lookup(table: dict[int, int], key: int) -> int:
+    return table[key]
+
+def bench_broadcast() -> None:
+    """par_map sends fn to each worker once. A user-supplied executor gets fn with every chunk."""
+    print("== broadcast fn ==")
+    processes, chunksize = 2, 1_000
+    p = Pipeline(range(100_000))
+    fn = functools.partial(lookup, {x: x for x in range(1_000_000)})
+    fn_bytes = len(pickle.dumps(fn))
+    chunks = -(-len(p) // chunksize)
+    print(f"fn pickles to {fn_bytes / 1e6:.1f} MB")
+    print(f"per chunk: {fn_bytes * chunks / 1e6:10.1f} MB of fn sent")
+    print(f"per worker: {fn_bytes * processes / 1e6:9.1f} MB of fn sent (at most, 0 when forked)")
+    with Pool(processes) as pool:
+        report("par_map(fn, executor=pool) (per chunk)", lambda: p.par_map(fn, chunksize=chunksize, executor=pool), repeat=1)
+    report("par_map(fn) (per worker)", lambda: p.par_map(fn, processes, chunksize=chunksize))
+
+def bench_small() -> None:
+    """Per-call latency of common operations and chains on tiny pipelines, where the constant
+    overhead of each call (building the result, generator frames, validation passes) dominates."""
+    print("== small pipelines ==")
+    number = 100_000
+    for n in (5, 50):
+        p = Pipeline(range(n))
+        pairs = p.zip(p)
+        nested = p.batch(5)
+        report(f"map ({n})", lambda: p.map(square), number, unit="us")
+        report(f"filter ({n})", lambda: p.filter(is_even), number, unit="us")
+        report(f"zip_with ({n})", lambda: p.zip_with(add, p), number, unit="us")
+        report(f"batch(5) ({n})", lambda: p.batch(5), number, unit="us")
+        report(f"group_by ({n})", lambda: p.group_by(is_even), number, unit="us")
+        report(f"flatten ({n})", lambda: nested.flatten(), number, unit="us")
+        report(f"unzip ({n})", lambda: pairs.unzip(), number, unit="us")
+        report(f"map.filter.sort.take ({n})", lambda: p.map(lambda x: x * x).filter(is_even).sort(reverse=True).take(3), 
+               number, unit="us")
+        report(f"batch.map(sum).zip_with ({n})", lambda: p.batch(5).map(sum).zip_with(add, p), number, unit="us")
+
+if __name__ == "__main__":
+    bench_extend()
+    bench_concat()
+    bench_slicing()
+    bench_broadcast()
+    bench_small()
@@ -1,17 +1,70 @@
 from oa_utils.pipeline import (
     Pipeline, 
+    SortedIndex, 
+    SortedPipeline, 
     Vector2, 
     unpack, 
+    argmin, 
+    argmax, 
     square, 
     swallow, 
+    is_even, 
     shuffle_batch
 )
+from oa_utils.parallel import (
+    Executor,
+    AutoChunksize,
+    AutoParallel,
+    Speculative,
+    PoolStats,
+    WorkerStats
+)
+from oa_utils.aggregates import Aggregator, Count, Sum, Min, Max, Mean
+from oa_utils.columnar import ColumnarPipeline
+from oa_utils.expr import Expr, col, attr, it, lit
+from oa_utils.incremental import (
+    IncrementalPipeline,
+    IncrementalResult
+)
+from oa_utils.distributed import (
+    DistributedExecutor,
+    WorkerLostError,
+    run_worker
+)
 
 __all__ = [
     "Pipeline",
+    "SortedIndex",
+    "SortedPipeline",
     "Vector2",
     "unpack",
+    "argmin",
+    "argmax",
     "square",
     "swallow",
+    "is_even",
     "shuffle_batch",
+    "Executor",
+    "AutoChunksize",
+    "AutoParallel",
+    "Speculative",
+    "PoolStats",
+    "WorkerStats",
+    "Aggregator",
+    "Count",
+    "Sum",
+    "Min",
+    "Max",
+    "Mean",
+    "ColumnarPipeline",
+    "Expr",
+    "col",
+    "attr",
+    "it",
+    "lit",
+    "IncrementalPipeline",
+    "IncrementalResult",
+    "DistributedExecutor",
+    "WorkerLostError",
+    "run_worker",
 ]
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Reducers for :meth:`oa_utils.Pipeline.aggregate` and :meth:`oa_utils.Pipeline.par_aggregate`.
+
+An :class:`Aggregator` folds elements into a state with :meth:`~Aggregator.step`, combines the states of
+two parts of the input with :meth:`~Aggregator.merge` and turns the final state into a result with
+:meth:`~Aggregator.result`. Each aggregator takes an optional *fn* that is applied to every element first,
+e.g. ``Sum(col('price'))``. Aggregators and their *fn* must be picklable for :meth:`~oa_utils.Pipeline.par_aggregate`.
+
+>>> from oa_utils import Pipeline
+>>> Pipeline([3, 1, 2]).aggregate(n=Count(), total=Sum(), lo=Min(), hi=Max(), mean=Mean())
+{'n': 3, 'total': 6, 'lo': 1, 'hi': 3, 'mean': 2.0}
+"""
+from __future__ import annotations
+import functools
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Mapping
+
+@dataclass(frozen=True)
+class Aggregator(ABC):
+    """Base class of the reducers. Subclasses implement :meth:`init`, :meth:`step` and :meth:`merge`,
+    and :meth:`result` if the state isn't the result."""
+    fn: Callable[[Any], Any] | None = None
+
+    @abstractmethod
+    def init(self) -> Any:
+        """Return the state before any element."""
+
+    @abstractmethod
+    def step(self, state: Any, value: Any) -> Any:
+        """Return the state after one more *value*."""
+
+    @abstractmethod
+    def merge(self, a: Any, b: Any) -> Any:
+        """Return the state of the values of two states *a* and *b*."""
+
+    def result(self, state: Any) -> Any:
+        """Return the result of a state."""
+        return state
+
+class Count(Aggregator):
+    """The number of elements."""
+
+    def init(self) -> int:
+        return 0
+
+    def step(self, state: int, value: Any) -> int:
+        return state + 1
+
+    def merge(self, a: int, b: int) -> int:
+        return a + b
+
+class Sum(Aggregator):
+    """The sum of the elements, 0 if there are none."""
+
+    def init(self) -> Any:
+        return 0
+
+    def step(self, state: Any, value: Any) -> Any:
+        return state + value
+
+    def merge(self, a: Any, b: Any) -> Any:
+        return a + b
+
+class Min(Aggregator):
+    """The smallest element, None if there are none."""
+
+    def init(self) -> tuple[bool, Any]:
+        return False, None
+
+    def step(self, state: tuple[bool, Any], value: Any) -> tuple[bool, Any]:
+        return (True, value) if not state[0] or value < state[1] else state
+
+    def merge(self, a: tuple[bool, Any], b: tuple[bool, Any]) -> tuple[bool, Any]:
+        return self.step(a, b[1]) if b[0] else a
+
+    def result(self, state: tuple[bool, Any]) -> Any:
+        return state[1]
+
+class Max(Min):
+    """The largest element, None if there are none."""
+
+    def step(self, state: tuple[bool, Any], value: Any) -> tuple[bool, Any]:
+        return (True, value) if not state[0] or value > state[1] else state
+
+class Mean(Aggregator):
+    """The arithmetic mean of the elements, None if there are none."""
+
+    def init(self) -> tuple[int, Any]:
+        return 0, 0
+
+    def step(self, state: tuple[int, Any], value: Any) -> tuple[int, Any]:
+        return state[0] + 1, state[1] + value
+
+    def merge(self, a: tuple[int, Any], b: tuple[int, Any]) -> tuple[int, Any]:
+        return a[0] + b[0], a[1] + b[1]
+
+    def result(self, state: tuple[int, Any]) -> float | None:
+        count, total = state
+        return total / count if count else None
+
+SHORTCUTS: dict[str, Callable[[], Aggregator]] = {
+    "count": Count, "sum": Sum, "min": Min, "max": Max, "mean": Mean, "avg": Mean,
+}
+
+def resolve(aggs: Mapping[str, str | Aggregator], **params: Any) -> dict[str, Aggregator]:
+    """Replace the names of :data:`SHORTCUTS` in *aggs* with new aggregators.
+    *params* are the other keyword arguments of the caller, so an aggregate named like one of them,
+    which Python binds to the parameter instead, is an error rather than silently dropped.
+
+    >>> resolve({}, by=Count())
+    Traceback (most recent call last):
+    ...
+    ValueError: Aggregate named 'by' collides with the parameter of the same name
+    """
+    for name, value in params.items():
+        if isinstance(value, (str, Aggregator)):
+            raise ValueError(f"Aggregate named {name!r} collides with the parameter of the same name")
+    try:
+        return {name: SHORTCUTS[agg]() if isinstance(agg, str) else agg for name, agg in aggs.items()}
+    except KeyError as e:
+        raise ValueError(f"Unknown aggregator {e.args[0]!r}, expected one of {list(SHORTCUTS)}") from None
+
+def fold(aggs: Mapping[str, Aggregator], by: Callable[[Any], Any] | None, items: Iterable[Any]) -> Any:
+    """Fold *items* into the states of *aggs* in one pass: a dict of states,
+    or a dict of such dicts per key if *by* is given."""
+    steps = [(name, agg.step, agg.fn) for name, agg in aggs.items()]
+    groups: dict[Any, dict[str, Any]] = {}
+    for item in items:
+        k = None if by is None else by(item)
+        states = groups.get(k)
+        if states is None:
+            states = groups[k] = {name: agg.init() for name, agg in aggs.items()}
+        for name, step, fn in steps:
+            states[name] = step(states[name], item if fn is None else fn(item))
+    if by is None:
+        return groups.get(None) or {name: agg.init() for name, agg in aggs.items()}
+    return groups
+
+def merge_folds(aggs: Mapping[str, Aggregator], by: Callable[[Any], Any] | None, a: Any, b: Any) -> Any:
+    """Merge two results of :func:`fold` over consecutive parts of the input."""
+    if by is None:
+        return {name: agg.merge(a[name], b[name]) for name, agg in aggs.items()}
+    merged = dict(a)
+    for k, states in b.items():
+        merged[k] = merge_folds(aggs, None, merged[k], states) if k in merged else states
+    return merged
+
+def finish(aggs: Mapping[str, Aggregator], by: Callable[[Any], Any] | None, states: Any) -> Any:
+    """Turn a result of :func:`fold` into the results of *aggs*."""
+    if by is None:
+        return {name: agg.result(states[name]) for name, agg in aggs.items()}
+    return {k: finish(aggs, None, group) for k, group in states.items()}
+
+def merge_all(aggs: Mapping[str, Aggregator], by: Callable[[Any], Any] | None, folds: Iterable[Any]) -> Any:
+    """Merge the results of :func:`fold` over consecutive parts of the input, in order."""
+    empty = {name: agg.init() for name, agg in aggs.items()} if by is None else {}
+    return functools.reduce(functools.partial(merge_folds, aggs, by), folds, empty)
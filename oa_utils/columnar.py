@@ -0,0 +1,182 @@
+"""Record data stored column by column (struct of arrays) instead of row by row.
+
+A :class:`ColumnarPipeline` keeps one :class:`~oa_utils.Pipeline` per field, so selecting, filtering,
+sorting and grouping walk plain columns instead of calling a lambda on every dict or dataclass.
+Columns given as numpy arrays of floats or bools are kept as arrays, so :meth:`~ColumnarPipeline.where` 
+and :meth:`~ColumnarPipeline.with_column` run over them as array operations.
+
+>>> from oa_utils import Pipeline, Vector2
+>>> points = ColumnarPipeline.from_rows(Pipeline([Vector2(3.0, 4.0), Vector2(1.0, 2.0)]))
+>>> points.column("x").sum()
+4.0
+>>> points.sort("x").to_rows(Vector2)
+(Vector2(x=1.0, y=2.0), Vector2(x=3.0, y=4.0))
+"""
+from __future__ import annotations
+import dataclasses
+import itertools
+import operator
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Mapping, Sequence
+from tabulate import tabulate
+from oa_utils.expr import Expr, col, _numpy
+from oa_utils.pipeline import Pipeline
+
+class ColumnarPipeline:
+    """A table of named columns of equal length.
+
+    >>> table = ColumnarPipeline({'name': ['Alice', 'Bob', 'Eve'], 'age': [30, 25, 35]})
+    >>> table.filter('age', lambda age: age > 26).select('name')
+    ColumnarPipeline({'name': ('Alice', 'Eve')})
+    """
+
+    def __init__(self, columns: Mapping[str, Iterable[Any]]) -> None:
+        # Pipelines, or numpy arrays of floats or bools
+        self._columns: dict[str, Any] = {
+            name: values if isinstance(values, Pipeline) or _is_array(values) else Pipeline(values)
+            for name, values in columns.items()}
+        if len({len(values) for values in self._columns.values()}) > 1:
+            raise ValueError("All columns must have the same length")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], fields: Sequence[str] | None = None) -> ColumnarPipeline:
+        """Split *rows* of dicts, dataclasses, named tuples or other objects into columns in a single pass.
+        The *fields* default to the keys, fields or attributes of the first row.
+
+        >>> ColumnarPipeline.from_rows([{'name': 'Alice', 'age': 30}, {'name': 'Bob', 'age': 25}])
+        ColumnarPipeline({'name': ('Alice', 'Bob'), 'age': (30, 25)})
+        """
+        rows = Pipeline(rows)
+        if not rows:
+            return cls({name: () for name in fields or ()})
+        first = rows[0]
+        if fields is None:
+            if isinstance(first, Mapping):
+                fields = list(first)
+            elif dataclasses.is_dataclass(first):
+                fields = [field.name for field in dataclasses.fields(first)]
+            elif hasattr(first, "_fields"):
+                fields = list(first._fields)
+            else:
+                fields = list(vars(first))
+        if not fields:
+            return cls({})
+        getter = operator.itemgetter if isinstance(first, Mapping) else operator.attrgetter
+        get = getter(*fields)
+        values = map(get, rows) if len(fields) > 1 else ((value,) for value in map(get, rows))
+        return cls(dict(zip(fields, zip(*values))))
+
+    def to_rows(self, factory: Callable[..., Any] = dict) -> Pipeline[Any]:
+        """Convert back to a pipeline of rows, calling *factory* with the fields as keyword arguments.
+
+        >>> ColumnarPipeline({'name': ['Alice'], 'age': [30]}).to_rows()
+        ({'name': 'Alice', 'age': 30},)
+        """
+        names = self.columns
+        return Pipeline(factory(**dict(zip(names, values))) for values in zip(*self._columns.values()))
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        """The column names."""
+        return tuple(self._columns)
+
+    def column(self, name: str) -> Pipeline[Any]:
+        """Return the column *name* as a Pipeline, without copying it unless it's a numpy array."""
+        values = self._columns[name]
+        return values if isinstance(values, Pipeline) else Pipeline(values.tolist())
+
+    def select(self, *names: str) -> ColumnarPipeline:
+        """Keep only the columns *names*, in that order, without copying them.
+
+        >>> ColumnarPipeline({'a': [1], 'b': [2], 'c': [3]}).select('c', 'a')
+        ColumnarPipeline({'c': (3,), 'a': (1,)})
+        """
+        return ColumnarPipeline({name: self._columns[name] for name in names})
+
+    def filter(self, name: str, pred: Callable[[Any], bool]) -> ColumnarPipeline:
+        """Keep only the rows for which *pred* returns True for the value in column *name*.
+
+        >>> ColumnarPipeline({'a': [1, 2, 3], 'b': 'xyz'}).filter('a', lambda a: a != 2)
+        ColumnarPipeline({'a': (1, 3), 'b': ('x', 'z')})
+        """
+        mask = list(map(pred, self._columns[name]))
+        return ColumnarPipeline({n: _compress(values, mask) for n, values in self._columns.items()})
+
+    def where(self, condition: Expr) -> ColumnarPipeline:
+        """Keep only the rows for which the expression *condition* over the columns is true
+        (see :meth:`~oa_utils.expr.Expr.evaluate_columns`).
+
+        >>> ColumnarPipeline({'a': [1, 2, 3], 'b': [3, 2, 1]}).where(col('a') < col('b'))
+        ColumnarPipeline({'a': (1,), 'b': (3,)})
+        """
+        mask = condition.evaluate_columns(self._columns)
+        return ColumnarPipeline({n: _compress(values, mask) for n, values in self._columns.items()})
+
+    def with_column(self, name: str, expr: Expr) -> ColumnarPipeline:
+        """Add or replace the column *name* with the values of the expression *expr* over the columns.
+
+        >>> ColumnarPipeline({'a': [1, 2]}).with_column('b', col('a') * 10)
+        ColumnarPipeline({'a': (1, 2), 'b': (10, 20)})
+        """
+        return ColumnarPipeline({**self._columns, name: expr.evaluate_columns(self._columns)})
+
+    def sort(self, name: str, reverse: bool = False) -> ColumnarPipeline:
+        """Sort the rows by the values in column *name*. The sort is stable.
+
+        >>> ColumnarPipeline({'a': [2, 1, 2], 'b': 'xyz'}).sort('a')
+        ColumnarPipeline({'a': (1, 2, 2), 'b': ('y', 'x', 'z')})
+        """
+        key = self._columns[name]
+        return self._take(sorted(range(len(key)), key=key.__getitem__, reverse=reverse))
+
+    def group_by(self, name: str) -> Pipeline[tuple[Any, ColumnarPipeline]]:
+        """Group the rows by the values in column *name*, like :meth:`Pipeline.group_by`.
+
+        >>> groups = ColumnarPipeline({'a': [1, 2, 1], 'b': 'xyz'}).group_by('a')
+        >>> groups.map(lambda group: (group[0], group[1].column('b')))
+        ((1, ('x', 'z')), (2, ('y',)))
+        """
+        indices: defaultdict[Any, list[int]] = defaultdict(list)
+        for i, key in enumerate(self._columns[name]):
+            indices[key].append(i)
+        return Pipeline((key, self._take(rows)) for key, rows in indices.items())
+
+    def to_table(self, tablefmt: str = "github",
+                 floatfmt: str | Iterable[str] = "g",
+                 intfmt: str | Iterable[str] = "",
+                 showindex: str | bool | Iterable[Any] = "default") -> str:
+        """Convert the columns to a formatted table string using :func:`tabulate`.
+
+        >>> print(ColumnarPipeline({'name': ['Alice', 'Bob'], 'age': [30, 25]}).to_table())
+        | name   |   age |
+        |--------|-------|
+        | Alice  |    30 |
+        | Bob    |    25 |
+        """
+        return tabulate(self._columns, headers="keys", tablefmt=tablefmt,
+                        floatfmt=floatfmt, intfmt=intfmt, showindex=showindex)
+
+    def _take(self, rows: Sequence[int]) -> ColumnarPipeline:
+        return ColumnarPipeline({name: values[list(rows)] if _is_array(values) else [values[i] for i in rows] 
+                                 for name, values in self._columns.items()})
+
+    def __len__(self) -> int:
+        return len(next(iter(self._columns.values()), ()))
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, ColumnarPipeline) and self.columns == other.columns
+                and all(self.column(name) == other.column(name) for name in self.columns))
+
+    def __repr__(self) -> str:
+        return f"ColumnarPipeline({self._columns!r})"
+
+def _is_array(values: Any) -> bool:
+    """Return True if *values* is a numpy array of floats or bools, which is kept as a column."""
+    np = _numpy()
+    return np is not None and isinstance(values, np.ndarray) and values.dtype.kind in "fb"
+
+def _compress(values: Any, mask: Sequence[Any]) -> Any:
+    """Return the *values* where *mask* is true, as an array if *values* is one."""
+    if _is_array(values):
+        return values[_numpy().asarray(mask, dtype=bool)]
+    return itertools.compress(values, mask)
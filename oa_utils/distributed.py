@@ -0,0 +1,278 @@
+"""Run the *par_** methods of a :class:`~oa_utils.Pipeline` on worker processes over TCP.
+
+A :class:`DistributedExecutor` listens for workers, splits the input into chunks and
+sends each chunk to an idle worker. Chunks of a worker that disconnects are retried
+on another worker, and results are returned in input order. Workers are started with
+:func:`run_worker`, either on other machines or locally with
+:meth:`DistributedExecutor.spawn_local_workers`::
+
+    python -m oa_utils.distributed HOST PORT   # authkey from $OA_UTILS_AUTHKEY or --authkey-file
+
+Chunks and results are pickled, so anyone who can connect with the authkey can run code 
+on the workers and the executor. Without an explicit authkey, the executor generates a random one 
+and only listens on a loopback address.
+
+>>> from oa_utils import Pipeline, square
+>>> with DistributedExecutor() as executor:
+...     executor.spawn_local_workers(2)
+...     Pipeline(range(1, 6)).par_map(square, executor=executor)
+(1, 4, 9, 16, 25)
+"""
+from __future__ import annotations
+import ipaddress
+import itertools
+import math
+import os
+import queue
+import threading
+import more_itertools
+from collections import deque
+from multiprocessing import Process
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+from oa_utils.parallel import apply_chunk
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+AUTHKEY_ENV = "OA_UTILS_AUTHKEY"
+
+class WorkerLostError(RuntimeError):
+    """Raised when a chunk was lost with its worker more than *max_retries* times, 
+    or when every worker was lost and no local worker is still starting."""
+
+class DistributedExecutor:
+    """Dispatch chunks of work to remote worker processes over TCP.
+    Pass it as the *executor* of the *par_** methods of a Pipeline.
+    *fn* and the elements must be picklable, and *fn* must be importable by the workers.
+
+    >>> from oa_utils import Pipeline
+    >>> from operator import add
+    >>> with DistributedExecutor() as executor:
+    ...     executor.spawn_local_workers(2)
+    ...     Pipeline([1, 2]).par_zip_with(add, [10, 20], executor=executor)
+    (11, 22)
+    """
+
+    def __init__(self, address: tuple[str, int] = ("127.0.0.1", 0),
+                 authkey: bytes | None = None,
+                 max_retries: int = 3,
+                 timeout: float | None = None) -> None:
+        if authkey is None:
+            if not _is_loopback(address[0]):
+                raise ValueError("Listening on a non-loopback address needs an explicit authkey")
+            authkey = os.urandom(32)
+        self._listener = Listener(address, authkey=authkey)
+        self.address: tuple[str, int] = self._listener.address
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._authkey = authkey
+        self._events: queue.Queue[tuple[str, int, Connection | None, int, Any]] = queue.Queue()
+        self._idle: list[Connection] = []
+        self._workers: dict[Connection, int] = {}
+        self._registered: set[int] = set()
+        self._lock = threading.Lock()
+        self._runs = itertools.count(1)
+        self._processes: list[Process] = []
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def authkey(self) -> bytes:
+        """The key the workers must connect with, e.g. to pass to :func:`run_worker` on other machines."""
+        return self._authkey
+
+    @property
+    def workers(self) -> list[int]:
+        """Return the process ids of the registered workers."""
+        with self._lock:
+            return list(self._workers.values())
+
+    def spawn_local_workers(self, n: int) -> None:
+        """Start *n* worker processes on this machine. They are stopped by :meth:`close`."""
+        for _ in range(n):
+            process = Process(target=run_worker, args=(self.address, self._authkey), daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def map(self, func: Callable[[T], U], iterable: Iterable[T], chunksize: int | None = None) -> list[U]:
+        """Apply *func* to every element on the workers, like :meth:`multiprocessing.pool.Pool.map`."""
+        return self._run(func, list(iterable), chunksize, star=False)
+
+    def starmap(self, func: Callable[..., U], iterable: Iterable[Iterable[Any]], chunksize: int | None = None) -> list[U]:
+        """Apply *func* to every tuple of arguments on the workers, like :meth:`multiprocessing.pool.Pool.starmap`."""
+        return self._run(func, [tuple(args) for args in iterable], chunksize, star=True)
+
+    def imap_unordered(self, func: Callable[[T], U], iterable: Iterable[T], chunksize: int = 1) -> Iterator[U]:
+        """Yield the results of *func* chunk by chunk as the workers finish them, 
+        like :meth:`multiprocessing.pool.Pool.imap_unordered`."""
+        for _, results in self._completed(func, list(iterable), chunksize, star=False):
+            yield from results
+
+    def close(self) -> None:
+        """Stop the workers and the listener."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            connections = list(self._workers)
+            stopped = set(self._workers.values())
+            self._workers.clear()
+        for conn in connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        try: # Wake up the accept thread, so it can close the listener
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        for process in self._processes:
+            if process.pid not in stopped: # Still starting up
+                process.terminate()
+            process.join()
+
+    def __enter__(self) -> DistributedExecutor:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                continue
+            if self._closed:
+                conn.close()
+                self._listener.close()
+                return
+            try:
+                _, pid = conn.recv()
+            except Exception:
+                conn.close()
+                continue
+            with self._lock:
+                self._workers[conn] = pid
+                self._registered.add(pid)
+            self._events.put(("worker", 0, conn, -1, None))
+
+    def _starting(self) -> bool:
+        """Return True if a local worker process is alive but hasn't registered yet."""
+        with self._lock:
+            return any(process.pid not in self._registered and process.is_alive() for process in self._processes)
+
+    def _run(self, func: Callable[..., U], items: list[Any], chunksize: int | None, star: bool) -> list[U]:
+        results: dict[int, list[U]] = dict(self._completed(func, items, chunksize, star))
+        return list(itertools.chain.from_iterable(results[index] for index in sorted(results)))
+
+    def _completed(self, func: Callable[..., U], items: list[Any], chunksize: int | None,
+                   star: bool) -> Iterator[tuple[int, list[U]]]:
+        if self._closed:
+            raise ValueError("DistributedExecutor is closed")
+        if chunksize is None:
+            chunksize = max(1, math.ceil(len(items) / (max(1, len(self.workers)) * 4)))
+        chunks = list(more_itertools.chunked(items, chunksize))
+        run = next(self._runs)
+        retries = [0] * len(chunks)
+        todo = deque(range(len(chunks)))
+        inflight = 0
+        while todo or inflight:
+            while todo and self._idle:
+                index = todo.popleft()
+                inflight += 1
+                threading.Thread(target=self._dispatch, daemon=True,
+                                 args=(run, self._idle.pop(), index, func, chunks[index], star)).start()
+            if not inflight and any(retries) and not self.workers and not self._starting():
+                # Every worker was lost, so no event will ever come unless a new one connects
+                raise WorkerLostError(f"All workers were lost with {len(todo)} chunks left")
+            try:
+                kind, event_run, conn, index, value = self._events.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No chunk finished within {self.timeout} seconds") from None
+            if conn is not None and kind != "lost":
+                self._idle.append(conn)
+            if event_run != run: # A new worker, or a straggler from a failed run
+                continue
+            inflight -= 1
+            if kind == "ok":
+                yield index, value
+            elif kind == "lost":
+                retries[index] += 1
+                if retries[index] > self.max_retries:
+                    raise WorkerLostError(f"Chunk {index} was lost {retries[index]} times")
+                todo.appendleft(index)
+            else:
+                raise value
+
+    def _dispatch(self, run: int, conn: Connection, index: int,
+                  func: Callable[..., Any], chunk: list[Any], star: bool) -> None:
+        try:
+            conn.send((func, chunk, star))
+            status, value = conn.recv()
+        except (OSError, EOFError):
+            with self._lock:
+                self._workers.pop(conn, None)
+            conn.close()
+            self._events.put(("lost", run, None, index, None))
+        except Exception as e: # e.g. func is not picklable
+            self._events.put(("error", run, conn, index, e))
+        else:
+            self._events.put((status, run, conn, index, value))
+
+def run_worker(address: tuple[str, int], authkey: bytes) -> None:
+    """Connect to the :class:`DistributedExecutor` at *address* and process chunks until it closes."""
+    with Client(address, authkey=authkey) as conn:
+        conn.send(("register", os.getpid()))
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            except Exception as e: # e.g. func can't be imported on this worker
+                conn.send(("error", e))
+                continue
+            if message is None:
+                return
+            func, chunk, star = message
+            try:
+                results = apply_chunk(func, star, chunk)
+            except Exception as e:
+                _send_error(conn, e)
+            else:
+                conn.send(("ok", results))
+
+def _is_loopback(host: str) -> bool:
+    """Return True if *host* is ``localhost`` or a loopback IP address."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError: # A host name
+        return False
+
+def _send_error(conn: Connection, e: Exception) -> None:
+    try:
+        conn.send(("error", e))
+    except Exception: # The exception itself isn't picklable
+        conn.send(("error", RuntimeError(repr(e))))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run an oa-utils DistributedExecutor worker.")
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--authkey-file", help=f"file holding the executor's authkey (default: ${AUTHKEY_ENV})")
+    args = parser.parse_args()
+    if args.authkey_file is not None:
+        with open(args.authkey_file, "rb") as f:
+            authkey = f.read().strip()
+    elif AUTHKEY_ENV in os.environ:
+        authkey = os.environ[AUTHKEY_ENV].encode()
+    else:
+        parser.error(f"pass --authkey-file or set ${AUTHKEY_ENV}")
+    run_worker((args.host, args.port), authkey)
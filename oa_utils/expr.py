@@ -0,0 +1,272 @@
+"""Expressions over elements that can be used in place of lambdas.
+
+``col('age') > 30`` builds an expression tree instead of running anything. Calling the expression
+compiles the whole tree into a single generated function (once), so an expression works wherever
+a function does: :meth:`~oa_utils.Pipeline.map`, :meth:`~oa_utils.Pipeline.filter`,
+:meth:`~oa_utils.Pipeline.sort`, :meth:`~oa_utils.Pipeline.group_by` and so on.
+Unlike a lambda, an expression can be pickled, so it can be sent to the *par_** process pool.
+:meth:`Expr.evaluate_columns` evaluates an expression over whole columns, with :mod:`numpy`
+array operations if the columns are float or bool numpy arrays.
+:class:`~oa_utils.columnar.ColumnarPipeline` uses it for :meth:`~oa_utils.columnar.ColumnarPipeline.where`
+and :meth:`~oa_utils.columnar.ColumnarPipeline.with_column`, and keeps such arrays as they are.
+
+>>> from oa_utils import Pipeline
+>>> people = Pipeline([{'name': 'Alice', 'age': 30}, {'name': 'Bob', 'age': 25}])
+>>> people.filter(col('age') > 26).map(col('name'))
+('Alice',)
+>>> Pipeline([1, 2, 3]).par_map(it() * 2 + 1, processes=2)
+(3, 5, 7)
+"""
+from __future__ import annotations
+import importlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Literal, Mapping, Sequence
+
+Mode = Literal["row", "columns", "vector"]
+
+class _Context:
+    """What the nodes render to: the element (*row*), zipped column values (*columns*)
+    or whole numpy arrays (*vector*)."""
+
+    def __init__(self, mode: Mode) -> None:
+        self.mode = mode
+        self.namespace: dict[str, Any] = {}
+        self.columns: dict[Any, str] = {} # Column name -> variable
+
+    def const(self, value: Any) -> str:
+        name = f"_c{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def column(self, name: Any) -> str:
+        return self.columns.setdefault(name, f"_v{len(self.columns)}")
+
+class Expr(ABC):
+    """An expression over an element. Build with :func:`col`, :func:`attr`, :func:`it` and :func:`lit`
+    combined with arithmetic, comparison and the logical operators ``&``, ``|`` and ``~``.
+    """
+    _compiled: Callable[[Any], Any] | None = None
+
+    @abstractmethod
+    def _render(self, ctx: _Context) -> str:
+        """Return the Python source of the expression in *ctx*."""
+
+    def source(self) -> str:
+        """Return the source of the generated function.
+
+        >>> (col('x') * 2 + 1).source()
+        'lambda _row: ((_row[_c0] * _c1) + _c2)'
+        """
+        return f"lambda _row: {self._render(_Context('row'))}"
+
+    def __call__(self, row: Any) -> Any:
+        if self._compiled is None:
+            ctx = _Context("row")
+            body = self._render(ctx)
+            self._compiled = eval(compile(f"lambda _row: {body}", "<oa_utils.expr>", "eval"), ctx.namespace)
+        return self._compiled(row)
+
+    def evaluate_columns(self, columns: Mapping[Any, Sequence[Any]]) -> list[Any]:
+        """Evaluate the expression for every row of *columns* of equal length, where :func:`col`
+        and :func:`attr` refer to columns. If all the columns it refers to are numpy arrays of floats 
+        or bools, the whole expression runs as array operations, with numpy's rules for division by zero. 
+        Otherwise one generated list comprehension runs over the zipped columns, with Python's rules, 
+        so e.g. Python ints never overflow.
+
+        >>> (col('x') * 2 + col('y')).evaluate_columns({'x': [1, 2], 'y': [10, 20]})
+        [12, 24]
+        """
+        n = len(next(iter(columns.values()), ()))
+        np = _numpy()
+        if np is not None:
+            ctx = _Context("vector")
+            body = self._render(ctx)
+            ctx.namespace["_np"] = np
+            arrays = [columns[name] for name in ctx.columns]
+            if arrays and all(isinstance(array, np.ndarray) and array.dtype.kind in "fb" for array in arrays):
+                fn = eval(f"lambda {', '.join(ctx.columns.values())}: {body}", ctx.namespace)
+                result: list[Any] = np.broadcast_to(np.asarray(fn(*arrays)), (n,)).tolist()
+                return result
+        ctx = _Context("columns")
+        body = self._render(ctx)
+        if not ctx.columns:
+            return [eval(body, ctx.namespace)] * n
+        targets = ", ".join(ctx.columns.values()) + ","
+        ctx.namespace["_cols"] = [columns[name] for name in ctx.columns]
+        return eval(f"[{body} for {targets} in zip(*_cols)]", ctx.namespace) # type: ignore
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Pickle the expression tree, not the generated function
+        state = dict(self.__dict__)
+        state.pop("_compiled", None)
+        return state
+
+    def __bool__(self) -> bool:
+        raise TypeError("Use &, | and ~ instead of and, or and not to combine expressions")
+
+    def __add__(self, other: Any) -> Expr: return BinOp("+", self, other)
+    def __radd__(self, other: Any) -> Expr: return BinOp("+", other, self)
+    def __sub__(self, other: Any) -> Expr: return BinOp("-", self, other)
+    def __rsub__(self, other: Any) -> Expr: return BinOp("-", other, self)
+    def __mul__(self, other: Any) -> Expr: return BinOp("*", self, other)
+    def __rmul__(self, other: Any) -> Expr: return BinOp("*", other, self)
+    def __truediv__(self, other: Any) -> Expr: return BinOp("/", self, other)
+    def __rtruediv__(self, other: Any) -> Expr: return BinOp("/", other, self)
+    def __floordiv__(self, other: Any) -> Expr: return BinOp("//", self, other)
+    def __rfloordiv__(self, other: Any) -> Expr: return BinOp("//", other, self)
+    def __mod__(self, other: Any) -> Expr: return BinOp("%", self, other)
+    def __rmod__(self, other: Any) -> Expr: return BinOp("%", other, self)
+    def __pow__(self, other: Any) -> Expr: return BinOp("**", self, other)
+    def __rpow__(self, other: Any) -> Expr: return BinOp("**", other, self)
+    def __lt__(self, other: Any) -> Expr: return BinOp("<", self, other)
+    def __le__(self, other: Any) -> Expr: return BinOp("<=", self, other)
+    def __gt__(self, other: Any) -> Expr: return BinOp(">", self, other)
+    def __ge__(self, other: Any) -> Expr: return BinOp(">=", self, other)
+    def __eq__(self, other: Any) -> Expr: return BinOp("==", self, other) # type: ignore[override]
+    def __ne__(self, other: Any) -> Expr: return BinOp("!=", self, other) # type: ignore[override]
+    def __and__(self, other: Any) -> Expr: return Logical("and", self, other)
+    def __rand__(self, other: Any) -> Expr: return Logical("and", other, self)
+    def __or__(self, other: Any) -> Expr: return Logical("or", self, other)
+    def __ror__(self, other: Any) -> Expr: return Logical("or", other, self)
+    def __invert__(self) -> Expr: return Not(self)
+    def __neg__(self) -> Expr: return Neg(self)
+
+    __hash__ = None # type: ignore[assignment]
+
+class Col(Expr):
+    """Item *name* of the element, e.g. a dict key or a tuple index."""
+
+    def __init__(self, name: Any) -> None:
+        self.name = name
+
+    def _render(self, ctx: _Context) -> str:
+        return f"_row[{ctx.const(self.name)}]" if ctx.mode == "row" else ctx.column(self.name)
+
+    def __repr__(self) -> str:
+        return f"col({self.name!r})"
+
+class Attr(Expr):
+    """Attribute *name* of the element, e.g. a dataclass field."""
+
+    def __init__(self, name: str) -> None:
+        if not name.isidentifier():
+            raise ValueError(f"Not an attribute name: {name!r}")
+        self.name = name
+
+    def _render(self, ctx: _Context) -> str:
+        return f"_row.{self.name}" if ctx.mode == "row" else ctx.column(self.name)
+
+    def __repr__(self) -> str:
+        return f"attr({self.name!r})"
+
+class It(Expr):
+    """The element itself."""
+
+    def _render(self, ctx: _Context) -> str:
+        if ctx.mode != "row":
+            raise ValueError("it() refers to whole elements, so it can't be evaluated over columns")
+        return "_row"
+
+    def __repr__(self) -> str:
+        return "it()"
+
+class Lit(Expr):
+    """A constant *value*."""
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def _render(self, ctx: _Context) -> str:
+        return ctx.const(self.value)
+
+    def __repr__(self) -> str:
+        return f"lit({self.value!r})"
+
+class BinOp(Expr):
+    """*left* *op* *right*, where *op* is an arithmetic or comparison operator."""
+
+    def __init__(self, op: str, left: Any, right: Any) -> None:
+        self.op, self.left, self.right = op, lit(left), lit(right)
+
+    def _render(self, ctx: _Context) -> str:
+        return f"({self.left._render(ctx)} {self.op} {self.right._render(ctx)})"
+
+    def __repr__(self) -> str:
+        return f"({self.left!r} {self.op} {self.right!r})"
+
+class Logical(Expr):
+    """*left* and/or *right*. Numpy arrays are combined with :func:`numpy.logical_and` or :func:`numpy.logical_or`."""
+
+    def __init__(self, op: Literal["and", "or"], left: Any, right: Any) -> None:
+        self.op, self.left, self.right = op, lit(left), lit(right)
+
+    def _render(self, ctx: _Context) -> str:
+        if ctx.mode == "vector":
+            return f"_np.logical_{self.op}({self.left._render(ctx)}, {self.right._render(ctx)})"
+        return f"({self.left._render(ctx)} {self.op} {self.right._render(ctx)})"
+
+    def __repr__(self) -> str:
+        return f"({self.left!r} {'&' if self.op == 'and' else '|'} {self.right!r})"
+
+class Not(Expr):
+    """Not *operand*. Numpy arrays are negated with :func:`numpy.logical_not`."""
+
+    def __init__(self, operand: Any) -> None:
+        self.operand = lit(operand)
+
+    def _render(self, ctx: _Context) -> str:
+        if ctx.mode == "vector":
+            return f"_np.logical_not({self.operand._render(ctx)})"
+        return f"(not {self.operand._render(ctx)})"
+
+    def __repr__(self) -> str:
+        return f"~{self.operand!r}"
+
+class Neg(Expr):
+    """Minus *operand*."""
+
+    def __init__(self, operand: Any) -> None:
+        self.operand = lit(operand)
+
+    def _render(self, ctx: _Context) -> str:
+        return f"(-{self.operand._render(ctx)})"
+
+    def __repr__(self) -> str:
+        return f"-{self.operand!r}"
+
+def col(name: Any) -> Expr:
+    """Refer to item *name* of the element (``element[name]``).
+
+    >>> (col('x') + col(0)).source()
+    'lambda _row: (_row[_c0] + _row[_c1])'
+    """
+    return Col(name)
+
+def attr(name: str) -> Expr:
+    """Refer to attribute *name* of the element (``element.name``).
+
+    >>> from oa_utils import Pipeline, Vector2
+    >>> Pipeline([Vector2(1.0, 2.0), Vector2(3.0, 0.0)]).sort(attr('y')).map(attr('x'))
+    (3.0, 1.0)
+    """
+    return Attr(name)
+
+def it() -> Expr:
+    """Refer to the element itself.
+
+    >>> from oa_utils import Pipeline
+    >>> Pipeline(range(10)).filter((it() % 3 == 0) & (it() > 0))
+    (3, 6, 9)
+    """
+    return It()
+
+def lit(value: Any) -> Expr:
+    """Return *value* as an expression, wrapping it unless it already is one."""
+    return value if isinstance(value, Expr) else Lit(value)
+
+def _numpy() -> Any:
+    """Return the numpy module, or None if it isn't installed."""
+    try:
+        return importlib.import_module("numpy")
+    except ImportError:
+        return None
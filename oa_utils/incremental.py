@@ -0,0 +1,146 @@
+"""Derived results that are updated incrementally when elements are appended to their source.
+
+An :class:`IncrementalPipeline` records a chain of element-wise :meth:`~IncrementalPipeline.map`,
+:meth:`~IncrementalPipeline.filter` and :meth:`~IncrementalPipeline.flat_map` stages, and ends in a terminal
+(:meth:`~IncrementalPipeline.sum`, :meth:`~IncrementalPipeline.len`, :meth:`~IncrementalPipeline.unique`
+or :meth:`~IncrementalPipeline.group_by`) that returns an :class:`IncrementalResult`.
+Appending to the result runs only the new elements through the chain.
+
+>>> from oa_utils import Pipeline
+>>> total = IncrementalPipeline(Pipeline([1, 2, 3])).map(lambda x: x * 10).sum()
+>>> total.value
+60
+>>> total.extend([4, 5]).value
+150
+"""
+from __future__ import annotations
+import functools
+import itertools
+from collections import defaultdict
+from typing import Any, Callable, Generic, Iterable, TypeVar
+from oa_utils.pipeline import Pipeline
+
+S = TypeVar("S")
+T = TypeVar("T")
+U = TypeVar("U")
+K = TypeVar("K")
+R = TypeVar("R")
+
+Stage = Callable[[Iterable[Any]], Iterable[Any]]
+
+class IncrementalPipeline(Generic[S, T]):
+    """A chain of element-wise stages over a source of *S* elements, producing *T* elements.
+    The chain is recorded, not run, until a terminal method is called.
+    """
+
+    def __init__(self: IncrementalPipeline[S, S], items: Iterable[S] = ()) -> None:
+        self._items: Pipeline[Any] = Pipeline(items)
+        self._stages: tuple[Stage, ...] = ()
+
+    def _then(self, stage: Stage) -> IncrementalPipeline[S, Any]:
+        chained: IncrementalPipeline[S, Any] = IncrementalPipeline(self._items)
+        chained._stages = self._stages + (stage,)
+        return chained
+
+    def map(self, fn: Callable[[T], U]) -> IncrementalPipeline[S, U]:
+        """Apply *fn* to every element.
+
+        >>> IncrementalPipeline([1, 2]).map(lambda x: x * 2).unique().value
+        (2, 4)
+        """
+        return self._then(functools.partial(map, fn))
+
+    def filter(self, pred: Callable[[T], bool]) -> IncrementalPipeline[S, T]:
+        """Keep only elements for which *pred* returns True.
+
+        >>> IncrementalPipeline([1, 2, 3, 4]).filter(lambda x: x % 2 == 0).sum().value
+        6
+        """
+        return self._then(functools.partial(filter, pred))
+
+    def flat_map(self, fn: Callable[[T], Iterable[U]]) -> IncrementalPipeline[S, U]:
+        """Map each element to an iterable and flatten the result.
+
+        >>> IncrementalPipeline([1, 2, 3]).flat_map(lambda x: [x] * x).len().value
+        6
+        """
+        return self._then(lambda items: itertools.chain.from_iterable(map(fn, items)))
+
+    def sum(self) -> IncrementalResult[S, T]:
+        """Keep the sum of the elements up to date.
+
+        >>> total = IncrementalPipeline([1, 2, 3]).sum()
+        >>> total.append(4).value
+        10
+        """
+        return IncrementalResult(self._stages, self._items, 0, lambda total, item: total + item, lambda total: total)
+
+    def len(self) -> IncrementalResult[S, int]:
+        """Keep the number of elements up to date.
+
+        >>> count = IncrementalPipeline(['a', 'b']).len()
+        >>> count.extend(['c']).value
+        3
+        """
+        return IncrementalResult(self._stages, self._items, 0, lambda count, _: count + 1, lambda count: count)
+
+    def unique(self) -> IncrementalResult[S, Pipeline[T]]:
+        """Keep the distinct elements up to date, in order of first appearance.
+
+        >>> distinct = IncrementalPipeline([1, 2, 2]).unique()
+        >>> distinct.extend([3, 1]).value
+        (1, 2, 3)
+        """
+        def step(seen: dict[T, None], item: T) -> dict[T, None]:
+            seen[item] = None
+            return seen
+        return IncrementalResult(self._stages, self._items, {}, step, Pipeline)
+
+    def group_by(self, key: Callable[[T], K]) -> IncrementalResult[S, Pipeline[tuple[K, Pipeline[T]]]]:
+        """Keep the (key, subgroup) pairs of :meth:`Pipeline.group_by` up to date.
+
+        >>> groups = IncrementalPipeline(['Roger', 'Alice']).group_by(lambda name: name[0])
+        >>> groups.extend(['Adam', 'Bob']).value
+        (('R', ('Roger',)), ('A', ('Alice', 'Adam')), ('B', ('Bob',)))
+        """
+        def step(grouped: defaultdict[K, list[T]], item: T) -> defaultdict[K, list[T]]:
+            grouped[key(item)].append(item)
+            return grouped
+        def finish(grouped: defaultdict[K, list[T]]) -> Pipeline[tuple[K, Pipeline[T]]]:
+            return Pipeline((k, Pipeline(v)) for k, v in grouped.items())
+        return IncrementalResult(self._stages, self._items, defaultdict(list), step, finish)
+
+class IncrementalResult(Generic[S, R]):
+    """The result of a terminal of an :class:`IncrementalPipeline`.
+    :meth:`extend` and :meth:`append` run only the new source elements through the chain
+    and fold them into the state behind :attr:`value`.
+    """
+
+    def __init__(self, stages: tuple[Stage, ...], items: Iterable[S], state: Any,
+                 step: Callable[[Any, Any], Any], finish: Callable[[Any], R]) -> None:
+        self._stages = stages
+        self._state = state
+        self._step = step
+        self._finish = finish
+        self._value: R | None = None
+        self.extend(items)
+
+    def extend(self, items: Iterable[S]) -> IncrementalResult[S, R]:
+        """Process the new source *items* and return self."""
+        elements: Iterable[Any] = items
+        for stage in self._stages:
+            elements = stage(elements)
+        self._state = functools.reduce(self._step, elements, self._state)
+        self._value = None
+        return self
+
+    def append(self, item: S) -> IncrementalResult[S, R]:
+        """Process one new source *item* and return self."""
+        return self.extend((item,))
+
+    @property
+    def value(self) -> R:
+        """The result for all the source elements seen so far."""
+        if self._value is None:
+            self._value = self._finish(self._state)
+        return self._value
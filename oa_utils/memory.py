@@ -0,0 +1,49 @@
+"""Memory accounting used by :meth:`oa_utils.Pipeline.memory_usage` and the size estimates of large results."""
+from __future__ import annotations
+import struct
+import sys
+from collections import deque
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any
+
+POINTER_BYTES = struct.calcsize("P")
+
+_SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+def deep_sizeof(obj: Any, seen: set[int] | None = None) -> int:
+    """Return the size in bytes of *obj* and everything reachable from it through containers
+    (tuples, lists, sets, dicts, deques) and instance attributes (``__dict__`` and ``__slots__``).
+    An object referenced more than once is counted once. Objects whose ids are in *seen* aren't counted,
+    and the ids of the counted objects are added to it. Classes, modules and functions are never counted.
+
+    >>> deep_sizeof([b"x" * 100] * 3) == sys.getsizeof([None] * 3) + sys.getsizeof(b"x" * 100)
+    True
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (tuple, list, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+def check_budget(operation: str, estimate: int, max_bytes: int | None) -> None:
+    """Raise :class:`MemoryError` if the *estimate* of the result of *operation* exceeds *max_bytes*."""
+    if max_bytes is not None and estimate > max_bytes:
+        raise MemoryError(f"{operation} would need about {estimate} bytes, more than max_bytes={max_bytes}")
@@ -0,0 +1,561 @@
+"""Process pool plumbing shared by the *par_** methods of :class:`~oa_utils.Pipeline`."""
+from __future__ import annotations
+import dataclasses
+import itertools
+import json
+import math
+import os
+import pickle
+import queue
+import statistics
+import time
+import functools
+import hashlib
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Any, Callable, Iterable, Iterator, Literal, Protocol, Sequence, TypeAlias, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+class Executor(Protocol):
+    """Anything that maps a function over an iterable in parallel, like :class:`multiprocessing.pool.Pool`
+    or :class:`oa_utils.distributed.DistributedExecutor`. Accepted by the *par_** methods."""
+
+    def map(self, func: Callable[[T], U], iterable: Iterable[T], chunksize: int | None = None) -> list[U]: ...
+
+    def starmap(self, func: Callable[..., U], iterable: Iterable[Iterable[Any]], chunksize: int | None = None) -> list[U]: ...
+
+    def imap_unordered(self, func: Callable[[T], U], iterable: Iterable[T], chunksize: int = 1) -> Iterator[U]: ...
+
+@dataclass
+class AutoChunksize:
+    """Pick chunk sizes for the *par_** methods by timing *fn* on a sample of the elements.
+    Pass an instance as the *chunksize* to inspect the measurements and the chosen sizes after the run,
+    or pass ``chunksize="auto"`` to use the defaults.
+
+    The first *sample_size* elements are processed serially while measuring the time and
+    the pickled size (input plus output) per element. The rest is split into chunks that shrink
+    as the work runs out (guided scheduling): early chunks are large to amortize IPC,
+    and late chunks are small so that a skewed chunk doesn't leave the other workers idle.
+    A chunk is never estimated to take less than *min_chunk_seconds* or to pickle to more than *max_chunk_bytes*.
+
+    >>> from oa_utils import Pipeline, square
+    >>> tuner = AutoChunksize(sample_size=10)
+    >>> Pipeline(range(100)).par_map(square, processes=2, chunksize=tuner).sum()
+    328350
+    >>> sum(tuner.chunksizes)
+    90
+    """
+    sample_size: int = 16
+    chunks_per_worker: int = 2
+    min_chunk_seconds: float = 0.01
+    max_chunk_bytes: int = 2**24
+    seconds_per_item: float = field(default=0.0, init=False)
+    pickle_bytes_per_item: float = field(default=0.0, init=False)
+    chunksizes: list[int] = field(default_factory=list, init=False)
+
+    def plan(self, n: int, workers: int) -> list[int]:
+        """Return the chunk sizes for *n* elements on *workers* workers from the measurements."""
+        smallest = max(1, math.ceil(self.min_chunk_seconds / max(self.seconds_per_item, 1e-9)))
+        largest = max(1, int(self.max_chunk_bytes // max(self.pickle_bytes_per_item, 1)))
+        sizes = []
+        remaining = n
+        while remaining > 0:
+            size = math.ceil(remaining / (workers * self.chunks_per_worker))
+            size = min(max(size, smallest), largest, remaining)
+            sizes.append(size)
+            remaining -= size
+        return sizes
+
+    def map(self, executor: Executor, fn: Callable[..., U], remote: Callable[..., U], 
+            items: Sequence[Any], star: bool, workers: int) -> list[U]:
+        """Sample *fn* serially, then map *remote* (*fn* as seen by the workers) over the remaining *items* on the *executor*."""
+        sample = items[:self.sample_size]
+        start = time.perf_counter()
+        head = apply_chunk(fn, star, sample)
+        if sample:
+            self.seconds_per_item = (time.perf_counter() - start) / len(sample)
+            self.pickle_bytes_per_item = (len(pickle.dumps(sample)) + len(pickle.dumps(head))) / len(sample)
+        rest = items[len(sample):]
+        self.chunksizes = self.plan(len(rest), workers)
+        bounds = itertools.pairwise(itertools.accumulate(self.chunksizes, initial=0))
+        chunks = [rest[start:end] for start, end in bounds]
+        tail = executor.map(functools.partial(apply_chunk, remote, star), chunks, 1)
+        return head + list(itertools.chain.from_iterable(tail))
+
+Chunksize: TypeAlias = "int | Literal['auto'] | AutoChunksize | None"
+
+@dataclass
+class AutoParallel:
+    """Decide between running serially and on a pool of processes by timing *fn* on a sample of the elements.
+    Pass ``parallel="auto"`` to :meth:`~oa_utils.Pipeline.map` and friends, or pass an instance 
+    to tune the cost model and to inspect the decision after the run.
+
+    The first *sample_size* elements are processed serially while measuring the time and
+    the pickled size (input plus output) per element. The rest runs in parallel only if 
+    the estimated pool cost (*startup_seconds*, plus the work divided among the processes, 
+    plus pickling *fn* and the elements at *seconds_per_byte*) beats the estimated serial cost.
+    Functions that can't be pickled, like lambdas, always run serially.
+
+    >>> from oa_utils import Pipeline
+    >>> auto = AutoParallel()
+    >>> Pipeline(range(100)).map(lambda x: x + 1, parallel=auto).sum()
+    5050
+    >>> auto.parallel, auto.reason
+    (False, 'fn is not picklable')
+    """
+    sample_size: int = 16
+    processes: int | None = None
+    startup_seconds: float = 0.05
+    seconds_per_byte: float = 2e-8
+    parallel: bool = field(default=False, init=False)
+    serial_seconds: float = field(default=0.0, init=False)
+    parallel_seconds: float = field(default=0.0, init=False)
+    reason: str = field(default="", init=False)
+
+    def decide(self, fn: Callable[..., Any], sample: Sequence[Any], results: Sequence[Any], seconds: float, n: int) -> bool:
+        """Estimate the cost of processing *n* more elements serially and in parallel 
+        from a *sample* that took *seconds* to turn into *results*, and record the decision."""
+        workers = self.processes or os.cpu_count() or 1
+        try:
+            fn_bytes = len(pickle.dumps(fn))
+            item_bytes = (len(pickle.dumps(sample)) + len(pickle.dumps(results))) / max(len(sample), 1)
+        except Exception:
+            self.parallel, self.reason = False, "fn is not picklable"
+            return False
+        self.serial_seconds = seconds / max(len(sample), 1) * n
+        self.parallel_seconds = (self.startup_seconds + self.serial_seconds / workers
+                                 + (fn_bytes * workers + item_bytes * n) * self.seconds_per_byte)
+        if workers == 1:
+            self.parallel, self.reason = False, "only one process"
+        elif n == 0:
+            self.parallel, self.reason = False, "no elements left after the sample"
+        else:
+            self.parallel = self.parallel_seconds < self.serial_seconds
+            self.reason = "estimated faster " + ("in parallel" if self.parallel else "serially")
+        return self.parallel
+
+    def map(self, fn: Callable[..., U], items: Sequence[Any], star: bool) -> list[U]:
+        """Map *fn* over *items* serially or in parallel, whichever is estimated to be faster."""
+        sample = items[:self.sample_size]
+        start = time.perf_counter()
+        head = apply_chunk(fn, star, sample)
+        rest = items[len(sample):]
+        if not self.decide(fn, sample, head, time.perf_counter() - start, len(rest)):
+            return head + apply_chunk(fn, star, rest)
+        with open_executor(self.processes, None, None, fn) as (pool, remote):
+            return head + (pool.starmap(remote, rest) if star else pool.map(remote, rest))
+
+    def reduce(self, fn: Callable[[T, T], T], items: Sequence[T]) -> T:
+        """Reduce non-empty *items* serially or with a parallel tree reduction, 
+        whichever is estimated to be faster. *fn* must be associative."""
+        sample = items[:self.sample_size]
+        start = time.perf_counter()
+        head = functools.reduce(fn, sample)
+        rest = items[len(sample):]
+        if not self.decide(fn, sample, [head], time.perf_counter() - start, len(rest)):
+            return functools.reduce(fn, rest, head)
+        with open_executor(self.processes, None, None, fn) as (pool, remote):
+            return fn(head, tree_reduce(pool, remote, list(rest), None))
+
+@dataclass
+class Speculative:
+    """Schedule the chunks of :meth:`~oa_utils.Pipeline.par_map` one by one to keep at most one chunk 
+    per worker in flight, and mitigate stragglers. Pass ``speculative=True`` to use the defaults,
+    or pass an instance to inspect the counters after the run. Needs an executor with
+    ``apply_async``, like :class:`multiprocessing.pool.Pool`.
+
+    When no chunks are left to start and a worker is idle, a chunk that has been running more than
+    *factor* times longer than expected from the median time per element of the finished chunks 
+    (at least *min_finished* of them) is started again on the idle worker, and the copy that finishes 
+    first wins. Near the end of the job, when there are fewer chunks left than idle workers, 
+    the largest remaining chunks are split in half. Results are returned in input order.
+    The chunksize must be fixed or None.
+
+    >>> from oa_utils import Pipeline, square
+    >>> scheduler = Speculative()
+    >>> Pipeline(range(10)).par_map(square, processes=2, chunksize=10, speculative=scheduler)
+    (0, 1, 4, 9, 16, 25, 36, 49, 64, 81)
+    >>> scheduler.splits # The only chunk was split in half for the second worker
+    1
+    """
+    factor: float = 2.0
+    min_finished: int = 3
+    poll_seconds: float = 0.01
+    speculated: int = field(default=0, init=False)
+    speculative_wins: int = field(default=0, init=False)
+    splits: int = field(default=0, init=False)
+
+    def map(self, executor: Any, remote: Callable[..., U], items: Sequence[Any], 
+            chunksize: int | None, star: bool, workers: int) -> list[U]:
+        """Map *remote* over *items* on the *executor* with *workers* worker processes."""
+        if chunksize is not None and chunksize < 1:
+            raise ValueError("Chunksize must be positive")
+        size = chunksize or max(1, math.ceil(len(items) / (workers * 4)))
+        pending = deque((start, min(start + size, len(items))) for start in range(0, len(items), size))
+        results: dict[int, list[U]] = {} # Chunk start -> results
+        running: dict[int, tuple[int, int, float]] = {} # Task id -> chunk start, end and start time
+        copied: set[int] = set() # Task ids of the stragglers and their copies
+        spares: set[int] = set() # Task ids of the copies
+        seconds_per_item: list[float] = []
+        events: queue.Queue[tuple[int, list[U] | None, BaseException | None]] = queue.Queue()
+        task_ids = itertools.count()
+        apply = functools.partial(apply_chunk, remote, star)
+
+        def submit(start: int, end: int) -> int:
+            task = next(task_ids)
+            running[task] = (start, end, time.perf_counter())
+            executor.apply_async(apply, (items[start:end],),
+                                 callback=lambda value: events.put((task, value, None)),
+                                 error_callback=lambda e: events.put((task, None, e)))
+            return task
+
+        while pending or any(start not in results for start, _, _ in running.values()):
+            while len(running) < workers:
+                if pending:
+                    self._split(pending, workers - len(running))
+                    submit(*pending.popleft())
+                    continue
+                straggler = self._straggler(running, results, copied, seconds_per_item)
+                if straggler is None:
+                    break
+                start, end, _ = running[straggler]
+                spare = submit(start, end)
+                copied.update((straggler, spare))
+                spares.add(spare)
+                self.speculated += 1
+            try:
+                task, value, error = events.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                continue
+            start, end, started = running.pop(task)
+            if error is not None:
+                raise error
+            if start in results: # The other copy won
+                continue
+            assert value is not None
+            results[start] = value
+            seconds_per_item.append((time.perf_counter() - started) / (end - start))
+            self.speculative_wins += task in spares
+        return list(itertools.chain.from_iterable(results[start] for start in sorted(results)))
+
+    def _split(self, pending: deque[tuple[int, int]], idle: int) -> None:
+        """Split the largest pending chunks in half while there are fewer of them than *idle* workers."""
+        while len(pending) < idle:
+            start, end = max(pending, key=lambda chunk: chunk[1] - chunk[0])
+            if end - start < 2:
+                return
+            pending.remove((start, end))
+            middle = (start + end) // 2
+            pending.extend([(start, middle), (middle, end)])
+            self.splits += 1
+
+    def _straggler(self, running: dict[int, tuple[int, int, float]], results: dict[int, Any],
+                   copied: set[int], seconds_per_item: list[float]) -> int | None:
+        """Return the task id of the slowest running chunk that should be started again, if any."""
+        if len(seconds_per_item) < self.min_finished:
+            return None
+        expected = statistics.median(seconds_per_item) * self.factor
+        now = time.perf_counter()
+        overdue = {task: (now - started) / (expected * (end - start)) 
+                   for task, (start, end, started) in running.items()
+                   if task not in copied and start not in results}
+        task = max(overdue, key=overdue.__getitem__, default=None)
+        return task if task is not None and overdue[task] > 1 else None
+
+@dataclass
+class WorkerStats:
+    """Counters of one worker process in :class:`PoolStats`."""
+    tasks: int = 0
+    busy_seconds: float = 0.0
+    idle_seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+@dataclass
+class PoolStats:
+    """Utilization counters of the *par_** methods. Pass an instance as their *stats* to collect
+    them, and reuse it across calls to accumulate. The chunks are pickled before they're sent, 
+    so the bytes are counted exactly, at the cost of copying every pickle once more.
+    The chunksize must be fixed or None. With an *executor*, pass its number of worker processes
+    as *processes*, which the counters can't find out. For the same reason, there's no queue depth:
+    the executor doesn't report how many chunks are waiting for a worker.
+
+    Per worker process id: the chunks completed (*tasks*), the time spent unpickling, processing 
+    and pickling them (*busy_seconds*), the rest of the time a map was running (*idle_seconds*) and 
+    the pickled bytes of the chunks (*bytes_in*) and of the results (*bytes_out*). For the pool: 
+    the number of maps (*runs*), their total *wall_seconds*, the sum of the wall time of every map times
+    its number of worker processes (*worker_seconds*), and the worker processes started beyond 
+    that number (*restarts*), e.g. because of *maxtasksperchild*.
+
+    >>> from oa_utils import Pipeline, square
+    >>> stats = PoolStats()
+    >>> Pipeline(range(100)).par_map(square, processes=2, chunksize=10, stats=stats).sum()
+    328350
+    >>> stats.tasks, stats.runs
+    (10, 1)
+    """
+    runs: int = 0
+    wall_seconds: float = 0.0
+    worker_seconds: float = 0.0
+    restarts: int = 0
+    workers: dict[int, WorkerStats] = field(default_factory=dict)
+
+    @property
+    def tasks(self) -> int:
+        """The chunks completed by all the workers."""
+        return sum(worker.tasks for worker in self.workers.values())
+
+    @property
+    def utilization(self) -> float:
+        """The busy time of the workers as a fraction of their *worker_seconds*."""
+        busy = sum(worker.busy_seconds for worker in self.workers.values())
+        return busy / self.worker_seconds if self.worker_seconds else 0.0
+
+    def map(self, executor: Executor, remote: Callable[..., U], items: Sequence[Any],
+            chunksize: int | None, star: bool, workers: int) -> list[U]:
+        """Map *remote* over *items* on the *executor* with *workers* worker processes, counting as it goes."""
+        if chunksize is not None and chunksize < 1:
+            raise ValueError("Chunksize must be positive")
+        size = chunksize or max(1, math.ceil(len(items) / (workers * 4)))
+        starts = range(0, len(items), size)
+        bytes_in: dict[int, int] = {}
+        def payloads() -> Iterator[tuple[int, bytes]]:
+            for index, start in enumerate(starts):
+                payload = pickle.dumps(items[start:start + size])
+                bytes_in[index] = len(payload)
+                yield index, payload
+        started = time.perf_counter()
+        results: list[list[U]] = [[] for _ in starts]
+        busy: dict[int, float] = {}
+        task = functools.partial(apply_pickled_chunk, remote, star)
+        for index, pid, seconds, payload in executor.imap_unordered(task, payloads()):
+            results[index] = pickle.loads(payload)
+            worker = self.workers.setdefault(pid, WorkerStats())
+            worker.tasks += 1
+            worker.busy_seconds += seconds
+            worker.bytes_in += bytes_in[index]
+            worker.bytes_out += len(payload)
+            busy[pid] = busy.get(pid, 0.0) + seconds
+        wall = time.perf_counter() - started
+        for pid, seconds in busy.items():
+            self.workers[pid].idle_seconds += max(0.0, wall - seconds)
+        self.runs += 1
+        self.wall_seconds += wall
+        self.worker_seconds += wall * workers
+        self.restarts += max(0, len(busy) - workers)
+        return list(itertools.chain.from_iterable(results))
+
+    def to_prometheus(self, prefix: str = "oa_utils_pool") -> str:
+        """Return the counters in the Prometheus text exposition format.
+
+        >>> print(PoolStats(runs=1).to_prometheus().splitlines()[2])
+        oa_utils_pool_runs_total 1
+        """
+        lines = []
+        def metric(name: str, kind: str, description: str, samples: Iterable[tuple[str, float]]) -> None:
+            lines.extend([f"# HELP {prefix}_{name} {description}", f"# TYPE {prefix}_{name} {kind}"])
+            lines.extend(f"{prefix}_{name}{labels} {value}" for labels, value in samples)
+        metric("runs_total", "counter", "Parallel maps run.", [("", self.runs)])
+        metric("wall_seconds_total", "counter", "Wall time of the parallel maps.", [("", self.wall_seconds)])
+        metric("worker_seconds_total", "counter", "Wall time of the parallel maps times their worker processes.",
+               [("", self.worker_seconds)])
+        metric("restarts_total", "counter", "Worker processes started beyond the pool size.", [("", self.restarts)])
+        for name, description in [("tasks", "Chunks completed."), ("busy_seconds", "Time spent on chunks."),
+                           ("idle_seconds", "Time spent waiting for chunks."),
+                           ("bytes_in", "Pickled bytes of the chunks received."),
+                           ("bytes_out", "Pickled bytes of the results sent.")]:
+            metric(f"worker_{name}_total", "counter", description,
+                   ((f'{{pid="{pid}"}}', getattr(worker, name)) for pid, worker in self.workers.items()))
+        return "\n".join(lines) + "\n"
+
+    def to_json(self, indent: int | None = 2) -> str:
+        """Return the counters as JSON.
+
+        >>> print(PoolStats().to_json(indent=None))
+        {"runs": 0, "wall_seconds": 0.0, "worker_seconds": 0.0, "restarts": 0, "workers": {}}
+        """
+        return json.dumps(dataclasses.asdict(self), indent=indent)
+
+    def write(self, path: str | os.PathLike[str]) -> None:
+        """Write the counters to *path* atomically, as JSON if it ends with ``.json``, otherwise in the 
+        Prometheus text format (e.g. a ``.prom`` file for the node exporter's textfile collector)."""
+        text = self.to_json() if os.fspath(path).endswith(".json") else self.to_prometheus()
+        _write_atomic(os.fspath(path), text.encode())
+
+Parallel: TypeAlias = "bool | Literal['auto'] | AutoParallel"
+
+def apply_chunk(fn: Callable[..., U], star: bool, chunk: Iterable[Any]) -> list[U]:
+    """Apply *fn* to every element of *chunk*, unpacking the arguments if *star* is True."""
+    return [fn(*args) for args in chunk] if star else [fn(item) for item in chunk]
+
+_worker_fn: Callable[..., Any] | None = None
+
+def install_worker_fn(fn: Callable[..., Any]) -> None:
+    """Pool initializer that keeps *fn* in the worker for :func:`call_worker_fn`."""
+    global _worker_fn
+    _worker_fn = fn
+
+def call_worker_fn(*args: Any) -> Any:
+    """Call the function installed in this worker by :func:`install_worker_fn`."""
+    assert _worker_fn is not None, "No function installed in this process"
+    return _worker_fn(*args)
+
+def collect(fn: Callable[..., Iterable[U]], *args: Any) -> list[U]:
+    """Call *fn* and collect the iterable it returns into a list, which can be sent back from a worker."""
+    return list(fn(*args))
+
+def outer_row(fn: Callable[[Any, Any], Any], other: Sequence[Any], agg: Callable[[Iterator[Any]], U], x: Any) -> U:
+    """Aggregate the row of *x* in the outer product with *other* without storing it."""
+    return agg(fn(x, y) for y in other)
+
+def first_occurrences(shard: list[tuple[int, Any]]) -> list[int]:
+    """Return the index of the first occurrence of every distinct element in a shard of (index, element) pairs."""
+    firsts: dict[Any, int] = {}
+    for i, item in shard:
+        firsts.setdefault(item, i)
+    return list(firsts.values())
+
+@contextmanager
+def open_executor(processes: int | None, maxtasksperchild: int | None, executor: Executor | None,
+                  fn: Callable[..., U]) -> Iterator[tuple[Executor, Callable[..., U]]]:
+    """Yield *executor* if given, otherwise a new pool that is terminated on exit, together with 
+    the function to send to it in place of *fn*. The new pool receives *fn* once per worker process,
+    so a large *fn* (e.g. a :func:`functools.partial` holding a lookup table) isn't pickled again for every chunk."""
+    if executor is not None:
+        yield executor, fn
+    else:
+        with Pool(processes=processes, maxtasksperchild=maxtasksperchild,
+                  initializer=install_worker_fn, initargs=(fn,)) as pool:
+            yield pool, call_worker_fn
+
+def check_stats(stats: PoolStats | None, processes: int | None, executor: Executor | None) -> None:
+    """Raise :class:`ValueError` if *stats* would have to guess the number of worker processes of *executor*."""
+    if stats is not None and executor is not None and processes is None:
+        raise ValueError("Pool stats with an executor need its number of worker processes as processes")
+
+def map_chunked(executor: Executor, fn: Callable[..., U], remote: Callable[..., U], items: Sequence[Any],
+                chunksize: Chunksize, star: bool, processes: int | None, stats: PoolStats | None = None) -> list[U]:
+    """Map *fn*, sent to the workers as *remote*, over *items* on the *executor* 
+    with a fixed or an automatic *chunksize*, collecting *stats* if given."""
+    if stats is not None:
+        if not (chunksize is None or isinstance(chunksize, int)):
+            raise ValueError("Pool stats need a fixed chunksize")
+        return stats.map(executor, remote, items, chunksize, star, processes or os.cpu_count() or 1)
+    if chunksize is None or isinstance(chunksize, int):
+        return executor.starmap(remote, items, chunksize) if star else executor.map(remote, items, chunksize)
+    tuner = AutoChunksize() if chunksize == "auto" else chunksize
+    return tuner.map(executor, fn, remote, items, star, processes or os.cpu_count() or 1)
+
+def apply_pickled_chunk(fn: Callable[..., Any], star: bool, 
+                        indexed: tuple[int, bytes]) -> tuple[int, int, float, bytes]:
+    """Like :func:`apply_indexed_chunk` for a pickled chunk, returning the index, the process id,
+    the seconds spent and the pickled results."""
+    start = time.perf_counter()
+    index, payload = indexed
+    results = pickle.dumps(apply_chunk(fn, star, pickle.loads(payload)))
+    return index, os.getpid(), time.perf_counter() - start, results
+
+def apply_indexed_chunk(fn: Callable[..., U], star: bool, indexed: tuple[int, Iterable[Any]]) -> tuple[int, list[U]]:
+    """Like :func:`apply_chunk` for an (index, chunk) pair, returning the index with the results."""
+    index, chunk = indexed
+    return index, apply_chunk(fn, star, chunk)
+
+def map_checkpointed(executor: Executor, fn: Callable[..., U], remote: Callable[..., U], items: Sequence[Any],
+                     chunksize: Chunksize, star: bool, directory: str | os.PathLike[str]) -> list[U]:
+    """Map *fn*, sent to the workers as *remote*, over *items* on the *executor*, saving the results
+    of every chunk to *directory* as soon as it finishes and loading the chunks saved by an earlier run.
+
+    The directory identifies the run: a manifest records the number of elements, the chunksize and 
+    a SHA-256 digest of the pickled *fn*, including the arguments of a :func:`functools.partial`, 
+    and a rerun that doesn't match it raises :class:`ValueError`. Chunk files are named by their index 
+    and hold a digest of the pickled elements of the chunk, so a chunk whose elements changed is 
+    processed again instead of loaded. Every chunk is pickled on every run to compute its digest.
+    The chunksize must be fixed or None. Without one, the elements are split into 256 chunks, 
+    independent of the number of processes."""
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(items) / 256))
+    if not isinstance(chunksize, int):
+        raise ValueError("Checkpointing needs a fixed chunksize, so the chunks are the same on every run")
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"length": len(items), "chunksize": chunksize, "star": star, "fn": _digest(fn)}
+    manifest_path = os.path.join(directory, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            saved = json.load(f)
+        if saved != manifest:
+            raise ValueError(f"{os.fspath(directory)!r} holds the checkpoints of another run: {saved}, not {manifest}")
+    except FileNotFoundError:
+        _write_atomic(manifest_path, json.dumps(manifest).encode())
+    chunks = [items[start:start + chunksize] for start in range(0, len(items), chunksize)]
+    paths = [os.path.join(directory, f"chunk-{index:06d}.pkl") for index in range(len(chunks))]
+    digests = [_digest(chunk) for chunk in chunks]
+    results: list[list[U]] = [[] for _ in chunks]
+    pending = []
+    for index, path in enumerate(paths):
+        try:
+            with open(path, "rb") as f:
+                digest, results[index] = pickle.load(f)
+        except FileNotFoundError:
+            digest = None
+        if digest != digests[index]:
+            pending.append((index, chunks[index]))
+    if pending:
+        task = functools.partial(apply_indexed_chunk, remote, star)
+        for index, chunk_results in executor.imap_unordered(task, pending):
+            _write_atomic(paths[index], pickle.dumps((digests[index], chunk_results)))
+            results[index] = chunk_results
+    return list(itertools.chain.from_iterable(results))
+
+def _digest(obj: Any) -> str:
+    """Return the SHA-256 digest of *obj* pickled."""
+    return hashlib.sha256(pickle.dumps(obj)).hexdigest()
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write *data* to *path* through a temporary file, so a crash never leaves a partial file."""
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+def tree_reduce(executor: Executor, fn: Callable[[T, T], T], values: list[T], chunksize: int | None) -> T:
+    """Reduce non-empty *values* by combining neighbouring pairs in parallel until one value is left."""
+    while len(values) > 1:
+        # pairwise grouping: (v0,v1), (v2,v3), ...
+        pairs = list(zip(values[::2], values[1::2]))
+        # reduce each pair in parallel
+        reduced = executor.starmap(fn, pairs, chunksize) if pairs else []
+        # carry over the last element if the list length was odd
+        if len(values) % 2 == 1:
+            reduced.append(values[-1])
+        values = reduced
+    return values[0]
+
+def prefix_block(fn: Callable[[T, T], T], carry: tuple[T, ...] | None, block: Sequence[T]) -> list[T]:
+    """One step of :func:`prefix_scan` in a worker: the total of *block* if *carry* is None, otherwise
+    the inclusive scan of *block*, continuing from the value in the 1-tuple *carry* if there is one."""
+    if carry is None:
+        return [functools.reduce(fn, block)]
+    if not carry:
+        return list(itertools.accumulate(block, fn))
+    return list(itertools.islice(itertools.accumulate(block, fn, initial=carry[0]), 1, None))
+
+def prefix_scan(executor: Executor, fn: Callable[[T, T], T], remote: Callable[..., list[T]], 
+                items: Sequence[T], chunksize: int | None, workers: int) -> list[T]:
+    """Return the inclusive scan of *items* with the associative *fn* in two parallel passes over blocks 
+    of *chunksize* items, where *remote* is :func:`prefix_block` with *fn* sent to the workers.
+    The first pass reduces every block but the last to its total, the totals are scanned here into 
+    the value before each block, and the second pass scans every block from that value.
+    Sending the blocks twice is cheaper than receiving the scanned blocks twice, as a scan-then-add would."""
+    size = chunksize or max(1, math.ceil(len(items) / (workers * 4)))
+    blocks = [items[start:start + size] for start in range(0, len(items), size)]
+    totals = executor.starmap(remote, [(None, block) for block in blocks[:-1]], 1)
+    carries = [()] + [(value,) for value in itertools.accumulate((total for [total] in totals), fn)]
+    return list(itertools.chain.from_iterable(executor.starmap(remote, zip(carries, blocks), 1)))
+
+def auto_parallel(parallel: Parallel) -> AutoParallel:
+    """Return the :class:`AutoParallel` for *parallel*, which is ``"auto"`` or an instance."""
+    return parallel if isinstance(parallel, AutoParallel) else AutoParallel()
@@ -2,14 +2,24 @@ from __future__ import annotations
 import functools
 import itertools
 import more_itertools
+import heapq
 import json
+import math
+import operator
 from pprint import pprint, pformat
 from tabulate import tabulate
 from collections import defaultdict
-from typing import IO, Callable, Iterable, Sequence, Literal, TypeVar, Any, overload
+from typing import IO, Callable, Generic, Iterable, Iterator, Sequence, Sized, Literal, TypeVar, Any, overload
 from dataclasses import dataclass
-from multiprocessing import Pool
+from oa_utils import aggregates, rolling, sampling, setops
+from oa_utils.aggregates import Aggregator
+from oa_utils.sampling import Seed
+from oa_utils.memory import POINTER_BYTES, deep_sizeof, check_budget
+from oa_utils.parallel import Executor, Chunksize, Parallel, PoolStats, Speculative, check_stats, open_executor, map_chunked, map_checkpointed, tree_reduce, auto_parallel, collect, first_occurrences, outer_row, prefix_block, prefix_scan
+from bisect import bisect_left, bisect_right
+import os
 import random
+import sys
 
 default_json_encoder = lambda obj: vars(obj) if hasattr(obj, '__dict__') else str(obj)
 
@@ -18,6 +28,7 @@ T = TypeVar("T")
 U = TypeVar("U")
 V = TypeVar("V")
 K = TypeVar("K")
+W = TypeVar("W")
 
 class Pipeline(tuple[T_co, ...]):
     """This class is useful for programming in the *collection pipeline* style.
@@ -37,26 +48,64 @@ class Pipeline(tuple[T_co, ...]):
     3
     """
 
-    def map(self, fn: Callable[[T_co], U]) -> Pipeline[U]:
+    def map(self, fn: Callable[[T_co], U], parallel: Parallel = False) -> Pipeline[U]:
         """Apply *fn* to every element.
+        With *parallel=True* this is :meth:`par_map`. With ``parallel="auto"`` or an 
+        :class:`~oa_utils.parallel.AutoParallel`, *fn* is timed on the first elements 
+        to decide whether the rest is faster serially or on a pool of processes.
         
         >>> Pipeline([1, 2, 3]).map(lambda x: x * 2)
         (2, 4, 6)
+        
+        >>> Pipeline([1, 2, 3]).map(square, parallel="auto")
+        (1, 4, 9)
         """
-        return Pipeline(map(fn, self))
+        if parallel is False:
+            return Pipeline(map(fn, self))
+        if parallel is True:
+            return self.par_map(fn)
+        return Pipeline(auto_parallel(parallel).map(fn, self, False))
 
     def par_map(self, fn: Callable[[T_co], U], 
                processes: int | None = None,
                maxtasksperchild: int | None = None,
-               chunksize: int | None = None) -> Pipeline[U]:
+               chunksize: Chunksize = None,
+               executor: Executor | None = None,
+               checkpoint_dir: str | os.PathLike[str] | None = None,
+               speculative: bool | Speculative = False,
+               stats: PoolStats | None = None) -> Pipeline[U]:
         """Apply *fn* to every element in parallel using a pool of processes.
-        *fn* must be picklable, so it can't be a lambda function.
+        *fn* must be picklable, so it can't be a lambda function. The pool receives it once per worker 
+        process, so it can carry large read-only data, e.g. a :func:`functools.partial` over a lookup table.
+        The *chunksize* is fixed, None, ``"auto"`` or an :class:`~oa_utils.parallel.AutoChunksize`.
+        An *executor*, e.g. a :class:`~oa_utils.distributed.DistributedExecutor`, runs the chunks 
+        instead of a new pool of *processes*. At most one of *checkpoint_dir* 
+        (see :func:`~oa_utils.parallel.map_checkpointed`), *speculative* 
+        (see :class:`~oa_utils.parallel.Speculative`) and *stats* (see :class:`~oa_utils.parallel.PoolStats`) 
+        can be given.
         
         >>> Pipeline(range(1, 11)).par_map(square, processes=2)
         (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+        
+        >>> Pipeline(range(1, 11)).par_map(square, processes=2, chunksize="auto")
+        (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
         """
-        with Pool(processes=processes, maxtasksperchild=maxtasksperchild) as pool:
-            return Pipeline(pool.map(fn, self, chunksize))
+        if checkpoint_dir is not None and speculative:
+            raise ValueError("Checkpointing can't be combined with speculative execution")
+        if stats is not None and (checkpoint_dir is not None or speculative):
+            raise ValueError("Pool stats can't be combined with checkpoint_dir or speculative")
+        check_stats(stats, processes, executor)
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            if checkpoint_dir is not None:
+                return Pipeline(map_checkpointed(pool, fn, remote, self, chunksize, False, checkpoint_dir))
+            if speculative:
+                if not (chunksize is None or isinstance(chunksize, int)):
+                    raise ValueError("Speculative execution needs a fixed chunksize")
+                if not hasattr(pool, "apply_async"):
+                    raise ValueError("Speculative execution needs an executor with apply_async")
+                scheduler = Speculative() if speculative is True else speculative
+                return Pipeline(scheduler.map(pool, remote, self, chunksize, False, processes or os.cpu_count() or 1))
+            return Pipeline(map_chunked(pool, fn, remote, self, chunksize, False, processes, stats))
 
     def filter(self, pred: Callable[[T_co], bool]) -> Pipeline[T_co]:
         """Keep only elements for which *pred* returns True.
@@ -66,6 +115,21 @@ class Pipeline(tuple[T_co, ...]):
         """
         return Pipeline(filter(pred, self))
 
+    def par_filter(self, pred: Callable[[T_co], bool],
+                   processes: int | None = None,
+                   maxtasksperchild: int | None = None,
+                   chunksize: Chunksize = None,
+                   executor: Executor | None = None,
+                   stats: PoolStats | None = None) -> Pipeline[T_co]:
+        """Keep only elements for which *pred* returns True, evaluating *pred* in parallel as in :meth:`par_map`.
+        *pred* must be picklable, so it can't be a lambda function.
+        
+        >>> Pipeline(range(1, 11)).par_filter(is_even, processes=2)
+        (2, 4, 6, 8, 10)
+        """
+        keep = self.par_map(pred, processes, maxtasksperchild, chunksize, executor, stats=stats)
+        return Pipeline(itertools.compress(self, keep))
+
     def zip(self, other: Iterable[U], strict: bool = False) -> Pipeline[tuple[T_co, U]]:
         """Pair each element with the corresponding element from *other* (like :func:`zip`).
         
@@ -85,22 +149,33 @@ class Pipeline(tuple[T_co, ...]):
         """
         return Pipeline(itertools.zip_longest(self, other, fillvalue=fillvalue))
 
-    def zip_with(self, fn: Callable[[T_co, U], V], other: Iterable[U], strict: bool = False) -> Pipeline[V]:
+    def zip_with(self, fn: Callable[[T_co, U], V], other: Iterable[U], strict: bool = False,
+                 parallel: Parallel = False) -> Pipeline[V]:
         """Zip with *other* and immediately combine pairs using *fn*.
+        See :meth:`map` for *parallel*.
         
         >>> Pipeline([1, 2]).zip_with(lambda a, b: a + b, [10, 20])
         (11, 22)
         """
-        return Pipeline(fn(a, b) for a, b in zip(self, other, strict=strict))
+        if parallel is False:
+            if not strict:
+                return Pipeline(map(fn, self, other))
+            return Pipeline([fn(a, b) for a, b in zip(self, other, strict=True)])
+        if parallel is True:
+            return self.par_zip_with(fn, other, strict=strict)
+        return Pipeline(auto_parallel(parallel).map(fn, list(zip(self, other, strict=strict)), True))
 
     def par_zip_with(self, fn: Callable[[T_co, U], V], 
                      other: Iterable[U],
                      strict: bool = False,
                      processes: int | None = None,
                      maxtasksperchild: int | None = None,
-                     chunksize: int | None = None) -> Pipeline[V]:
+                     chunksize: Chunksize = None,
+                     executor: Executor | None = None,
+                     stats: PoolStats | None = None) -> Pipeline[V]:
         """Zip with *other* and immediately combine pairs using *fn* in parallel.
         *fn* must be picklable, so it can't be a lambda function.
+        See :meth:`par_map` for *chunksize*, *executor* and *stats*.
         
         >>> from operator import add
         >>> Pipeline([1, 2]).par_zip_with(add, [10, 20], processes=2)
@@ -112,8 +187,10 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2, 3, 4] * 3).batch(4).par_zip_with(shuffle_batch, seeds, processes=2)
         ((1, 2, 4, 3), (4, 2, 3, 1), (4, 3, 1, 2))
         """
-        with Pool(processes=processes, maxtasksperchild=maxtasksperchild) as pool:
-            return Pipeline(pool.starmap(fn, zip(self, other, strict=strict), chunksize))
+        check_stats(stats, processes, executor)
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            pairs = list(zip(self, other, strict=strict))
+            return Pipeline(map_chunked(pool, fn, remote, pairs, chunksize, True, processes, stats))
 
     def join_with(self: Pipeline[T], separator: T) -> Pipeline[T]:
         """Join elements with a *separator*.
@@ -139,31 +216,140 @@ class Pipeline(tuple[T_co, ...]):
         return Pipeline(Pipeline(batch) for batch in more_itertools.split_at(
             self, pred, maxsplit=maxsplit, keep_separator=keep_separator))
 
-    def cartesian_product(self, other: Iterable[U]) -> Pipeline[tuple[T_co, U]]:
+    def cartesian_product(self, other: Iterable[U], max_bytes: int | None = None) -> Pipeline[tuple[T_co, U]]:
         """Return the Cartesian product of *self* x *other*.
+        With *max_bytes*, raise :class:`MemoryError` instead if :meth:`estimate_cartesian_product` exceeds it.
         
         >>> Pipeline([1, 2]).cartesian_product([10, 20])
         ((1, 10), (1, 20), (2, 10), (2, 20))
         """
+        if max_bytes is not None:
+            other = tuple(other)
+            check_budget("cartesian_product", self.estimate_cartesian_product(other), max_bytes)
         return Pipeline(itertools.product(self, other))
 
-    def outer_product(self, fn: Callable[[T_co, U], V], other: Iterable[U]) -> Pipeline[Pipeline[V]]:
+    def estimate_cartesian_product(self, other: Sized) -> int:
+        """Estimate the bytes taken by :meth:`cartesian_product` without running it.
+        The elements themselves are shared with the inputs, so only the pipeline and the pairs are counted.
+        *other* must have a length, so an iterator isn't used up by the estimate. 
+        Materialize it first (e.g. with :class:`tuple`) and pass the result to both methods.
+        
+        >>> Pipeline(range(1000)).estimate_cartesian_product(range(1000)) > 10**7
+        True
+        """
+        n = len(self) * len(other)
+        return _pipeline_bytes(n) + n * sys.getsizeof((None, None))
+
+    def outer_product(self, fn: Callable[[T_co, U], V], other: Iterable[U], max_bytes: int | None = None) -> Pipeline[Pipeline[V]]:
         """Return the outer product of *self* x *other* using *fn* to combine pairs.
+        With *max_bytes*, raise :class:`MemoryError` instead if :meth:`estimate_outer_product` exceeds it.
         
         >>> Pipeline([1, 2, 3]).outer_product(lambda a, b: a * b, [1, 2, 3])
         ((1, 2, 3), (2, 4, 6), (3, 6, 9))
         """
+        if max_bytes is not None:
+            other = tuple(other)
+            check_budget("outer_product", self.estimate_outer_product(fn, other), max_bytes)
         return Pipeline(Pipeline(row) for row in more_itertools.outer_product(func=fn, xs=self, ys=other))
 
-    def sort(self, key: Callable[[T_co], Any] | None = None, reverse: bool = False) -> Pipeline[T_co]:
-        """Sort the elements.
+    def cartesian_product_blocks(self, other: Iterable[U], size: int = 65536) -> Iterator[Pipeline[tuple[T_co, U]]]:
+        """Lazily yield the pairs of :meth:`cartesian_product` in blocks of *size*, 
+        so that only one block is in memory at a time.
+        
+        >>> list(Pipeline([1, 2]).cartesian_product_blocks([10, 20], 3))
+        [((1, 10), (1, 20), (2, 10)), ((2, 20),)]
+        """
+        return map(Pipeline, more_itertools.chunked(itertools.product(self, other), size))
+
+    def estimate_outer_product(self, fn: Callable[[T_co, U], Any], other: Sequence[U]) -> int:
+        """Estimate the bytes taken by :meth:`outer_product` without running it.
+        *fn* is called once, on the first pair, and every result is assumed to be as large as that one.
+        Like in :meth:`estimate_cartesian_product`, *other* must be a sequence, not an iterator.
+        
+        >>> Pipeline(range(1000)).estimate_outer_product(lambda a, b: str(a * b), range(1000)) > 10**7
+        True
+        """
+        results = len(self) * len(other)
+        result_bytes = deep_sizeof(fn(self[0], other[0])) if results else 0
+        return _pipeline_bytes(len(self)) + len(self) * _pipeline_bytes(len(other)) + results * result_bytes
+
+    def outer_product_tiles(self, fn: Callable[[T_co, U], V], other: Iterable[U],
+                            rows: int = 256, cols: int = 256) -> Iterator[tuple[int, int, Pipeline[Pipeline[V]]]]:
+        """Lazily yield the outer product of :meth:`outer_product` in tiles of at most *rows* x *cols*,
+        as (first row, first column, tile) triples, so that only one tile is in memory at a time.
+        
+        >>> for i, j, tile in Pipeline([1, 2, 3]).outer_product_tiles(lambda a, b: a * b, [1, 2, 3], 2, 2):
+        ...     print(i, j, tile)
+        0 0 ((1, 2), (2, 4))
+        0 2 ((3,), (6,))
+        2 0 ((3, 6),)
+        2 2 ((9,),)
+        """
+        other = tuple(other)
+        for i in range(0, len(self), rows):
+            for j in range(0, len(other), cols):
+                ys = other[j:j + cols]
+                yield i, j, Pipeline(Pipeline(fn(x, y) for y in ys) for x in self[i:i + rows])
+
+    def par_outer_product(self, fn: Callable[[T_co, U], V], other: Iterable[U],
+                          processes: int | None = None,
+                          maxtasksperchild: int | None = None,
+                          chunksize: Chunksize = None,
+                          executor: Executor | None = None) -> Pipeline[Pipeline[V]]:
+        """Return the outer product of *self* x *other* using *fn* to combine pairs, computing the rows
+        in parallel as in :meth:`par_map`. *other* is sent to each worker process once, together with *fn*.
+        
+        >>> Pipeline([1, 2, 3]).par_outer_product(operator.mul, [1, 2, 3], processes=2)
+        ((1, 2, 3), (2, 4, 6), (3, 6, 9))
+        """
+        return self.par_outer_reduce(fn, other, Pipeline, processes, maxtasksperchild, chunksize, executor)
+
+    def outer_reduce(self, fn: Callable[[T_co, U], V], other: Iterable[U], agg: Callable[[Iterator[V]], W]) -> Pipeline[W]:
+        """Aggregate every row of the outer product of *self* x *other* with *agg*, 
+        e.g. :func:`min` or :func:`argmin`, without storing the rows.
+        
+        >>> Pipeline([1, 5, 9]).outer_reduce(lambda a, b: abs(a - b), [0, 4, 8], argmin)
+        (0, 1, 2)
+        """
+        other = tuple(other)
+        return Pipeline(outer_row(fn, other, agg, x) for x in self)
+
+    def par_outer_reduce(self, fn: Callable[[T_co, U], V], other: Iterable[U], agg: Callable[[Iterator[V]], W],
+                         processes: int | None = None,
+                         maxtasksperchild: int | None = None,
+                         chunksize: Chunksize = None,
+                         executor: Executor | None = None) -> Pipeline[W]:
+        """Aggregate every row of the outer product of *self* x *other* with *agg* in parallel, 
+        as in :meth:`par_map`. *fn* and *agg* must be picklable, so they can't be lambda functions.
+        
+        >>> Pipeline([1, 5, 9]).par_outer_reduce(operator.sub, [0, 4, 8], max, processes=2)
+        (1, 5, 9)
+        """
+        return self.par_map(functools.partial(outer_row, fn, tuple(other), agg), 
+                            processes, maxtasksperchild, chunksize, executor)
+
+    @overload
+    def sort(self, key: Callable[[T_co], Any] | None = None, reverse: bool = False, 
+             remember: Literal[False] = False) -> Pipeline[T_co]: ...
+    @overload
+    def sort(self, key: Callable[[T_co], Any] | None = None, reverse: bool = False, *, 
+             remember: Literal[True]) -> SortedPipeline[T_co]: ...
+    def sort(self, key: Callable[[T_co], Any] | None = None, reverse: bool = False, 
+             remember: bool = False) -> Pipeline[T_co]:
+        """Sort the elements. With *remember*, return a :class:`SortedPipeline` that remembers 
+        the *key* and the direction, so later lookups can use the order.
         
         >>> Pipeline([3, 1, 2]).sort()
         (1, 2, 3)
         
         >>> Pipeline([3, 1, 2]).sort(reverse=True)
         (3, 2, 1)
+        
+        >>> 2 in Pipeline([3, 1, 2]).sort(remember=True)
+        True
         """
+        if remember:
+            return SortedPipeline(self, key, reverse)
         return Pipeline(sorted(self, key=key, reverse=reverse)) # type: ignore
 
     def unique(self) -> Pipeline[T_co]:
@@ -173,7 +359,137 @@ class Pipeline(tuple[T_co, ...]):
         (1, 2, 3)
         """
         return Pipeline(dict.fromkeys(self))
+
+    def par_unique(self, processes: int | None = None,
+                   maxtasksperchild: int | None = None,
+                   executor: Executor | None = None) -> Pipeline[T_co]:
+        """Remove duplicates while preserving order, in parallel. 
+        The elements are hash-partitioned into one shard per process, so equal elements meet in the same shard, 
+        and each shard is deduplicated by a worker. See :meth:`par_map` for *executor*.
+        
+        >>> Pipeline([1, 2, 2, 3, 1]).par_unique(processes=2)
+        (1, 2, 3)
+        """
+        shards = self.enumerate().partition_by(lambda pair: pair[1], processes or os.cpu_count() or 1)
+        with open_executor(processes, maxtasksperchild, executor, first_occurrences) as (pool, remote):
+            firsts = pool.map(remote, shards, 1)
+        return Pipeline(self[i] for i in sorted(itertools.chain.from_iterable(firsts)))
     
+    def intersect(self, other: Iterable[Any], key: Callable[[Any], Any] | None = None,
+                  assume_sorted: bool = False, parallel: bool = False, processes: int | None = None) -> Pipeline[T_co]:
+        """Return the distinct elements of *self* that are also in *other*, in order, 
+        comparing the elements by *key* if given. See :meth:`union` for the other parameters.
+        
+        >>> Pipeline([3, 1, 2, 1]).intersect([1, 3, 5])
+        (3, 1)
+        """
+        return self._setop(setops.INTERSECT, other, key, assume_sorted, parallel, processes)
+
+    def difference(self, other: Iterable[Any], key: Callable[[Any], Any] | None = None,
+                   assume_sorted: bool = False, parallel: bool = False, processes: int | None = None) -> Pipeline[T_co]:
+        """Return the distinct elements of *self* that are not in *other*, in order, 
+        comparing the elements by *key* if given. See :meth:`union` for the other parameters.
+        
+        >>> Pipeline([3, 1, 2, 1]).difference([1, 5])
+        (3, 2)
+        """
+        return self._setop(setops.DIFFERENCE, other, key, assume_sorted, parallel, processes)
+
+    def union(self, other: Iterable[U], key: Callable[[Any], Any] | None = None,
+              assume_sorted: bool = False, parallel: bool = False, processes: int | None = None) -> Pipeline[T_co | U]:
+        """Return the distinct elements of *self* followed by those of *other* that are not in *self*,
+        comparing the elements by *key* if given. The keys must be hashable.
+        If both pipelines are sorted by *key*, *assume_sorted* merges them in one pass without hashing
+        (so the keys only need to be comparable) and the result is sorted.
+        With *parallel*, the elements are hash-partitioned by key into one shard per process 
+        (*processes* defaults to the number of CPUs) and the shards are processed by a pool of workers.
+        The *key* must then be picklable.
+        
+        >>> Pipeline([3, 1, 1]).union([2, 3, 4])
+        (3, 1, 2, 4)
+        
+        >>> Pipeline([1, 1, 3]).union([2, 3, 4], assume_sorted=True)
+        (1, 2, 3, 4)
+        """
+        return self._setop(setops.UNION, other, key, assume_sorted, parallel, processes)
+
+    def symmetric_difference(self, other: Iterable[U], key: Callable[[Any], Any] | None = None,
+                             assume_sorted: bool = False, parallel: bool = False, 
+                             processes: int | None = None) -> Pipeline[T_co | U]:
+        """Return the distinct elements of *self* that are not in *other*, followed by those of *other* 
+        that are not in *self*, comparing the elements by *key* if given. See :meth:`union` for the other parameters.
+        
+        >>> Pipeline([3, 1, 2]).symmetric_difference([2, 5, 1, 4])
+        (3, 5, 4)
+        """
+        return self._setop(setops.SYMMETRIC_DIFFERENCE, other, key, assume_sorted, parallel, processes)
+
+    def _setop(self, op: setops.SetOp, other: Iterable[Any], key: Callable[[Any], Any] | None, 
+               assume_sorted: bool, parallel: bool, processes: int | None) -> Pipeline[Any]:
+        other = other if isinstance(other, Sequence) else tuple(other)
+        if assume_sorted:
+            return Pipeline(setops.merge_setop(op, key, self, other))
+        if not parallel:
+            left, right = setops.hash_setop(op, key, enumerate(self), enumerate(other))
+        else:
+            n = processes or os.cpu_count() or 1
+            shards: list[tuple[list[tuple[int, Any]], list[tuple[int, Any]]]] = [([], []) for _ in range(n)]
+            for side, items in enumerate((self, other)):
+                for i, item in enumerate(items):
+                    shards[hash(item if key is None else key(item)) % n][side].append((i, item))
+            fn = functools.partial(setops.hash_setop, op, key)
+            with open_executor(processes, None, None, fn) as (pool, remote):
+                kept = pool.starmap(remote, shards, 1)
+            left = sorted(itertools.chain.from_iterable(lefts for lefts, _ in kept))
+            right = sorted(itertools.chain.from_iterable(rights for _, rights in kept))
+        return Pipeline(itertools.chain(map(self.__getitem__, left), map(other.__getitem__, right)))
+
+    def partition_by(self, key: Callable[[T_co], Any], n: int) -> Pipeline[Pipeline[T_co]]:
+        """Split the elements into *n* shards in one pass, by the hash of their *key*,
+        so elements with equal keys land in the same shard. Elements keep their order within a shard.
+        String hashes differ between interpreter runs, so the shards are only stable within one run.
+        
+        >>> Pipeline(range(10)).partition_by(lambda x: x % 3, 3)
+        ((0, 3, 6, 9), (1, 4, 7), (2, 5, 8))
+        """
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        shards: list[list[T_co]] = [[] for _ in range(n)]
+        for item in self:
+            shards[hash(key(item)) % n].append(item)
+        return Pipeline(map(Pipeline, shards))
+
+    def partition_by_range(self, key: Callable[[T_co], Any], boundaries: Sequence[Any]) -> Pipeline[Pipeline[T_co]]:
+        """Split the elements into ``len(boundaries) + 1`` shards in one pass, by the range of their *key*:
+        shard *i* holds the keys from ``boundaries[i - 1]`` (inclusive) to ``boundaries[i]`` (exclusive).
+        The *boundaries* must be sorted. Elements keep their order within a shard.
+        
+        >>> Pipeline([5, 25, 1, 10, 30]).partition_by_range(lambda x: x, [10, 20])
+        ((5, 1), (10,), (25, 30))
+        """
+        shards: list[list[T_co]] = [[] for _ in range(len(boundaries) + 1)]
+        for item in self:
+            shards[bisect_right(boundaries, key(item))].append(item)
+        return Pipeline(map(Pipeline, shards))
+
+    def par_map_partitions(self, fn: Callable[[Pipeline[T_co]], Iterable[U]], key: Callable[[T_co], Any],
+                           processes: int | None = None,
+                           maxtasksperchild: int | None = None,
+                           executor: Executor | None = None) -> Pipeline[U]:
+        """Shuffle the elements to the worker processes by *key* with :meth:`partition_by`, 
+        one shard per process, apply *fn* to each shard and concatenate the results in shard order.
+        All the elements with the same key are seen by the same call of *fn*, so *fn* can group, 
+        join or deduplicate its shard on its own. *fn* must be picklable. See :meth:`par_map` for *executor*.
+        
+        >>> groups = Pipeline(range(10)).par_map_partitions(
+        ...     functools.partial(Pipeline.group_by, key=is_even), is_even, processes=2)
+        >>> sorted(groups)
+        [(False, (1, 3, 5, 7, 9)), (True, (0, 2, 4, 6, 8))]
+        """
+        shards = self.partition_by(key, processes or os.cpu_count() or 1)
+        with open_executor(processes, maxtasksperchild, executor, functools.partial(collect, fn)) as (pool, remote):
+            return Pipeline(pool.map(remote, shards, 1)).flatten()
+
     def slice(self, start: int = 0, end: int | None = None, step: int = 1) -> Pipeline[T_co]:
         """Return a slice of the pipeline like *self[start:end:step]*.
         
@@ -182,7 +498,7 @@ class Pipeline(tuple[T_co, ...]):
         """
         if end is None:
             end = len(self)
-        return Pipeline(self[start:end:step])
+        return self._slice(start, end, step)
 
     def take(self, n: int) -> Pipeline[T_co]:
         """Return the first *n* items.
@@ -193,7 +509,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2, 3, 4]).take(-1)
         (1, 2, 3)
         """
-        return Pipeline(self[:n])
+        return self._slice(None, n)
     
     def drop(self, n: int) -> Pipeline[T_co]:
         """Drop the first *n* items.
@@ -204,7 +520,15 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2, 3, 4]).drop(-3)
         (2, 3, 4)
         """
-        return Pipeline(self[n:])
+        return self._slice(n, None)
+
+    def _slice(self, start: int | None, end: int | None, step: int | None = None) -> Pipeline[T_co]:
+        """Return *self[start:end:step]* as a pipeline. Pipelines are immutable, so a slice 
+        that covers the whole pipeline in order returns *self* without copying."""
+        indices = range(len(self))
+        if indices[start:end:step] == indices:
+            return self
+        return Pipeline(self[start:end:step])
 
     def enumerate(self, start: int = 0) -> Pipeline[tuple[int, T_co]]:
         """Enumerate the pipeline, yielding (index, item) pairs.
@@ -220,8 +544,13 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline(range(1, 6)).batch(2)
         ((1, 2), (3, 4), (5,))
         """
-        return Pipeline([Pipeline(batch) for batch 
-                         in more_itertools.chunked(self, n, strict=strict)])
+        if n < 1:
+            return Pipeline([Pipeline(batch) for batch in more_itertools.chunked(self, n, strict=strict)])
+        if strict and len(self) % n:
+            # Same error as more_itertools.chunked, which this mirrors
+            raise ValueError("iterable is not divisible by n.")
+        # Slices of the tuple are copied in C, without an iterator per batch
+        return Pipeline([Pipeline(self[i:i + n]) for i in range(0, len(self), n)])
     
     def batch_fill(self, n: int, 
                    fillvalue: U,
@@ -234,15 +563,65 @@ class Pipeline(tuple[T_co, ...]):
         return Pipeline([Pipeline(row) for row in more_itertools.grouper(
                         self, n, incomplete=incomplete, fillvalue=fillvalue)])
 
+    def sliding_window(self, n: int, step: int = 1) -> Pipeline[Pipeline[T_co]]:
+        """Return every window of *n* consecutive elements, starting a new window every *step* elements.
+        Incomplete windows at the end are dropped.
+        
+        >>> Pipeline(range(1, 6)).sliding_window(3)
+        ((1, 2, 3), (2, 3, 4), (3, 4, 5))
+        
+        >>> Pipeline(range(1, 7)).sliding_window(2, step=2)
+        ((1, 2), (3, 4), (5, 6))
+        """
+        if n < 1 or step < 1:
+            raise ValueError("n and step must be at least 1")
+        return Pipeline([Pipeline(self[i:i + n]) for i in range(0, len(self) - n + 1, step)])
+
+    @overload
+    def rolling(self, n: int, agg: Literal['sum', 'min', 'max']) -> Pipeline[T_co]: ...
+    @overload
+    def rolling(self, n: int, agg: Literal['mean', 'var']) -> Pipeline[float]: ...
+    @overload
+    def rolling(self, n: int, agg: Callable[[Pipeline[T_co]], U]) -> Pipeline[U]: ...
+    def rolling(self, n: int, agg: str | Callable[[Pipeline[T_co]], Any]) -> Pipeline[Any]:
+        """Aggregate every window of *n* consecutive elements. 
+        ``'sum'``, ``'mean'``, ``'min'``, ``'max'`` and ``'var'`` (sample variance) are computed incrementally 
+        in O(1) amortized time per window. Any other *agg* is called with each window from :meth:`sliding_window`.
+        
+        >>> Pipeline([1, 3, 2, 5, 4]).rolling(3, 'sum')
+        (6, 10, 11)
+        
+        >>> Pipeline([1, 3, 2, 5, 4]).rolling(3, 'max')
+        (3, 5, 5)
+        
+        >>> Pipeline([1, 3, 2, 5, 4]).rolling(3, lambda window: window[-1] - window[0])
+        (1, 2, 2)
+        """
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        if callable(agg):
+            return self.sliding_window(n).map(agg)
+        if agg == 'var' and n < 2:
+            raise ValueError("Variance needs a window of at least 2 elements")
+        aggregates = {'sum': rolling.rolling_sum, 'mean': rolling.rolling_mean, 
+                      'min': rolling.rolling_min, 'max': rolling.rolling_max, 'var': rolling.rolling_var}
+        if agg not in aggregates:
+            raise ValueError(f"Unknown aggregate: {agg!r}")
+        return Pipeline(aggregates[agg](self, n))
+
     def flatten(self: Pipeline[Iterable[T]]) -> Pipeline[T]:
         """Flatten one level of nesting.
         
         >>> Pipeline([[1, 2], [3, 4]]).flatten()
         (1, 2, 3, 4)
         """
-        if not all(isinstance(item, Iterable) for item in self):
-            raise ValueError("flatten requires a Pipeline of Iterables")
-        return Pipeline(itertools.chain.from_iterable(self))
+        try:
+            return Pipeline(itertools.chain.from_iterable(self))
+        except TypeError:
+            # Only check the elements when something failed, so the common case is a single pass
+            if not all(isinstance(item, Iterable) for item in self):
+                raise ValueError("flatten requires a Pipeline of Iterables") from None
+            raise
 
     def flat_map(self, fn: Callable[[T_co], Iterable[U]]) -> Pipeline[U]:
         """Map each element to an iterable and flatten the result.
@@ -255,8 +634,48 @@ class Pipeline(tuple[T_co, ...]):
         """
         return self.map(fn).flatten()
 
-    def for_each(self, fn: Callable[[T_co], None]) -> Pipeline[T_co]:
+    def par_flat_map(self, fn: Callable[[T_co], Iterable[U]],
+                     processes: int | None = None,
+                     maxtasksperchild: int | None = None,
+                     chunksize: Chunksize = None,
+                     executor: Executor | None = None,
+                     stats: PoolStats | None = None) -> Pipeline[U]:
+        """Map each element to an iterable in parallel as in :meth:`par_map` and flatten the result.
+        *fn* must be picklable, so it can't be a lambda function.
+        
+        >>> Pipeline([1, 2, 3]).par_flat_map(range, processes=2)
+        (0, 0, 1, 0, 1, 2)
+        """
+        return self.par_map(functools.partial(collect, fn), processes, 
+                            maxtasksperchild, chunksize, executor, stats=stats).flatten()
+
+    def map_batches(self, fn: Callable[[Pipeline[T_co]], Iterable[U]], size: int) -> Pipeline[U]:
+        """Call *fn* once per :meth:`batch` of *size* elements and flatten the results in order.
+        Useful when *fn* has a high fixed cost per call (e.g. opening a connection or compiling a regex).
+        
+        >>> Pipeline([3, 1, 2, 6, 5, 4]).map_batches(lambda batch: batch.sort(), 3)
+        (1, 2, 3, 4, 5, 6)
+        """
+        return self.batch(size).flat_map(fn)
+
+    def par_map_batches(self, fn: Callable[[Pipeline[T_co]], Iterable[U]], size: int,
+                        processes: int | None = None,
+                        maxtasksperchild: int | None = None,
+                        chunksize: Chunksize = None,
+                        executor: Executor | None = None,
+                        stats: PoolStats | None = None) -> Pipeline[U]:
+        """Like :meth:`map_batches`, but the batches are processed in parallel as in :meth:`par_map`.
+        *fn* must be picklable, so it can't be a lambda function.
+        
+        >>> Pipeline([3, 1, 2, 6, 5, 4]).par_map_batches(sorted, 3, processes=2)
+        (1, 2, 3, 4, 5, 6)
+        """
+        return self.batch(size).par_map(functools.partial(collect, fn), processes, 
+                                        maxtasksperchild, chunksize, executor, stats=stats).flatten()
+
+    def for_each(self, fn: Callable[[T_co], None], parallel: Parallel = False) -> Pipeline[T_co]:
         """Call a side-effecting function for every element and return self.
+        See :meth:`map` for *parallel*.
         
         >>> Pipeline([1, 2, 3]).for_each(print)
         1
@@ -264,23 +683,32 @@ class Pipeline(tuple[T_co, ...]):
         3
         (1, 2, 3)
         """
-        for item in self:
-            fn(item)
+        if parallel is False:
+            for item in self:
+                fn(item)
+        elif parallel is True:
+            self.par_for_each(fn)
+        else:
+            auto_parallel(parallel).map(fn, self, False)
         return self
 
     def par_for_each(self, fn: Callable[[T_co], None],
                      processes: int | None = None,
                      maxtasksperchild: int | None = None,
-                     chunksize: int | None = None) -> Pipeline[T_co]:
+                     chunksize: Chunksize = None,
+                     executor: Executor | None = None,
+                     stats: PoolStats | None = None) -> Pipeline[T_co]:
         """Call a side-effecting function for every element in parallel 
         using a pool of processes and return self.
         *fn* must be picklable, so it can't be a lambda function.
+        See :meth:`par_map` for *chunksize*, *executor* and *stats*.
         
         >>> Pipeline(range(1, 11)).par_for_each(swallow, processes=2)
         (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
         """
-        with Pool(processes=processes, maxtasksperchild=maxtasksperchild) as pool:
-            pool.map(fn, self, chunksize)
+        check_stats(stats, processes, executor)
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            map_chunked(pool, fn, remote, self, chunksize, False, processes, stats)
         return self
 
     def for_self(self, fn: Callable[[Pipeline[T_co]], None]) -> Pipeline[T_co]:
@@ -307,8 +735,9 @@ class Pipeline(tuple[T_co, ...]):
         """
         return Pipeline(fn(self))
 
-    def transpose(self: Pipeline[Iterable[T]]) -> Pipeline[Pipeline[T]]:
+    def transpose(self: Pipeline[Iterable[T]], max_bytes: int | None = None) -> Pipeline[Pipeline[T]]:
         """Transpose a pipeline of iterables (like :func:`more_itertools.transpose`).
+        With *max_bytes*, raise :class:`MemoryError` instead if :meth:`estimate_transpose` exceeds it.
         
         >>> Pipeline([["Roger", "Alice", "Bob"], [24, 35, 60]]).transpose()
         (('Roger', 24), ('Alice', 35), ('Bob', 60))
@@ -316,8 +745,23 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([[1, 2, 3], [4, 5, 6]]).transpose()
         ((1, 4), (2, 5), (3, 6))
         """
+        if max_bytes is not None:
+            check_budget("transpose", self.estimate_transpose(), max_bytes)
         return Pipeline(Pipeline(row) for row in more_itertools.transpose(self))   
 
+    def estimate_transpose(self: Pipeline[Iterable[Any]]) -> int:
+        """Estimate the bytes taken by :meth:`transpose` without running it. The rows must have a length.
+        
+        >>> Pipeline([range(1000)] * 1000).estimate_transpose() > 8 * 10**6
+        True
+        """
+        if not self:
+            return _pipeline_bytes(0)
+        first = self[0]
+        if not isinstance(first, Sized):
+            raise TypeError("estimate_transpose needs rows with a length")
+        return _pipeline_bytes(len(first)) + len(first) * _pipeline_bytes(len(self))
+
     def print(self, label: str = "", 
               label_only: bool = False,
               end: str | None = "\n",
@@ -445,13 +889,18 @@ class Pipeline(tuple[T_co, ...]):
             print(end, file=stream)
         return self
 
-    def extend(self, items: Iterable[T_co]) -> Pipeline[T_co]:
+    def extend(self, *items: Iterable[T_co]) -> Pipeline[T_co]:
         """Return a new pipeline with *items* appended.
+        Several iterables can be passed at once and are copied in a single pass,
+        so prefer collecting the parts and calling *extend* once over extending in a loop.
         
         >>> Pipeline([1, 2]).extend([3, 4])
         (1, 2, 3, 4)
+        
+        >>> Pipeline([1, 2]).extend([3], (4, 5), range(6, 8))
+        (1, 2, 3, 4, 5, 6, 7)
         """
-        return Pipeline(self + tuple(items))
+        return Pipeline(itertools.chain(self, *items))
     
     def insert_at(self, index: int, items: Iterable[T_co]) -> Pipeline[T_co]:
         """Insert *items* at *index*.
@@ -459,7 +908,9 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2, 5]).insert_at(2, [3, 4])
         (1, 2, 3, 4, 5)
         """
-        return Pipeline(self[:index] + tuple(items) + self[index:])
+        index, _, _ = slice(index, None).indices(len(self))
+        return Pipeline(itertools.chain(
+            itertools.islice(self, index), items, itertools.islice(self, index, None)))
     
     def reverse(self) -> Pipeline[T_co]:
         """Reverse the order of the elements.
@@ -467,7 +918,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2, 3]).reverse()
         (3, 2, 1)
         """
-        return Pipeline(reversed(self))
+        return self._slice(None, None, -1)
 
     def group_by(self, key: Callable[[T_co], K]) -> Pipeline[tuple[K, Pipeline[T_co]]]:
         """Group elements by *key* and return (key, subgroup) pairs.
@@ -489,27 +940,149 @@ class Pipeline(tuple[T_co, ...]):
         grouped: defaultdict[K, list[T_co]] = defaultdict(list)
         for item in self:
             grouped[key(item)].append(item)
-        return Pipeline((k, Pipeline(v)) for k, v in grouped.items())
+        subgroups: Iterator[Pipeline[T_co]] = map(Pipeline, grouped.values())
+        return Pipeline(zip(grouped, subgroups))
 
-    def sample(self, n: int) -> Pipeline[T_co]:
-        """Select *n* random elements from the pipeline. 
-        For repeatable results, set the random seed before calling this method.
+    @overload
+    def index_by(self, key: Callable[[T_co], K], unique: Literal[False] = False) -> dict[K, Pipeline[T_co]]: ...
+    @overload
+    def index_by(self, key: Callable[[T_co], K], unique: Literal[True]) -> dict[K, T_co]: ...
+    def index_by(self, key: Callable[[T_co], K], unique: bool = False) -> dict[K, Pipeline[T_co]] | dict[K, T_co]:
+        """Build a reusable hash index of the elements by *key* for O(1) lookups.
+        By default every key maps to a pipeline of its elements. 
+        With *unique=True* every key maps to a single element and duplicate keys raise a ValueError.
+        
+        >>> people = [{'id': 1, 'name': 'Roger'}, {'id': 2, 'name': 'Alice'}]
+        >>> Pipeline(people).index_by(lambda person: person['id'], unique=True)[2]
+        {'id': 2, 'name': 'Alice'}
+        
+        >>> Pipeline(['Roger', 'Alice', 'Adam']).index_by(lambda name: name[0])['A']
+        ('Alice', 'Adam')
+        """
+        if not unique:
+            return dict(self.group_by(key))
+        index: dict[K, T_co] = {}
+        for item in self:
+            k = key(item)
+            if k in index:
+                raise ValueError(f"Duplicate key: {k!r}")
+            index[k] = item
+        return index
+
+    def sorted_index(self, key: Callable[[T_co], Any]) -> SortedIndex[T_co]:
+        """Build a reusable index of the elements sorted by *key* for O(log n) range queries.
+        
+        >>> index = Pipeline([5, 1, 4, 2, 3]).sorted_index(lambda x: x)
+        >>> index.between(2, 4)
+        (2, 3, 4)
+        >>> index.lt(3)
+        (1, 2)
+        """
+        return SortedIndex(self, key)
+
+    def sample(self, n: int, seed: Seed | None = None, weights: Sequence[float] | None = None) -> Pipeline[T_co]:
+        """Select *n* random elements from the pipeline without replacement. 
+        For repeatable results, pass a *seed*, which draws from its own :class:`random.Random`, 
+        or set the random seed before calling this method.
+        With *weights*, one per element, each element is picked with a probability proportional to its weight.
         
         >>> random.seed(1234)
         >>> Pipeline([1, 2, 3, 4, 5]).sample(3)
         (4, 1, 5)
+        
+        >>> Pipeline([1, 2, 3, 4, 5]).sample(3, seed=1234)
+        (4, 1, 5)
+        
+        >>> Pipeline(['a', 'b', 'c']).sample(2, seed=1, weights=[0, 1, 1])
+        ('c', 'b')
         """
-        return Pipeline(random.sample(self, n))
+        if weights is not None:
+            return Pipeline(sampling.weighted_sample(self, n, weights, random.Random(sampling.new_seed(seed))))
+        return Pipeline(random.sample(self, n) if seed is None else random.Random(seed).sample(self, n))
+
+    def par_sample(self, n: int, seed: Seed | None = None, weights: Sequence[float] | None = None, 
+                   block: int = 65536,
+                   processes: int | None = None,
+                   maxtasksperchild: int | None = None,
+                   executor: Executor | None = None) -> Pipeline[T_co]:
+        """Like :meth:`sample`, but the elements are split into blocks of *block* elements and the workers
+        draw the random keys of the blocks, each block from its own random stream 
+        (see :mod:`oa_utils.sampling`). Only the lengths or *weights* of the blocks are sent to the workers.
+        For a given *seed* and *block*, the sample is the same whatever the number of processes.
+        See :meth:`par_map` for *executor*.
+        
+        >>> Pipeline(range(100)).par_sample(3, seed=1234, block=10, processes=2)
+        (56, 87, 88)
+        """
+        if block < 1:
+            raise ValueError("Block size must be positive")
+        if not 0 <= n <= len(self):
+            raise ValueError("Sample larger than population or is negative")
+        if weights is not None and len(weights) != len(self):
+            raise ValueError("Expected one weight per element")
+        seed = sampling.new_seed(seed)
+        blocks = [(index, start, list(weights[start:start + block]) if weights is not None else min(block, len(self) - start))
+                  for index, start in enumerate(range(0, len(self), block))]
+        fn = functools.partial(sampling.block_sample, seed, n)
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            tops = pool.map(remote, blocks, 1)
+        winners = heapq.nlargest(n, itertools.chain.from_iterable(tops))
+        if len(winners) < n:
+            raise ValueError("Sample larger than the elements with a positive weight")
+        return Pipeline(self[i] for _, i in winners)
     
-    def shuffle(self) -> Pipeline[T_co]:
+    def shuffle(self, seed: Seed | None = None) -> Pipeline[T_co]:
         """Shuffle the elements. 
-        For repeatable results, set the random seed before calling this method.
+        For repeatable results, pass a *seed* or set the random seed before calling this method.
         
         >>> random.seed(1234)
         >>> Pipeline([1, 2, 3, 4, 5]).shuffle()
         (4, 1, 5, 3, 2)
+        
+        >>> Pipeline([1, 2, 3, 4, 5]).shuffle(seed=1234)
+        (4, 1, 5, 3, 2)
+        """
+        return self.sample(self.len(), seed)
+
+    def par_shuffle(self, seed: Seed | None = None, block: int = 65536,
+                    processes: int | None = None,
+                    maxtasksperchild: int | None = None,
+                    executor: Executor | None = None) -> Pipeline[T_co]:
+        """Shuffle the elements in parallel. The elements are split into blocks of *block* elements,
+        every element is scattered to a random bucket (one per block) with its block's random stream, 
+        and the workers shuffle the buckets, each with its own stream (see :mod:`oa_utils.sampling`).
+        For a given *seed* and *block*, the order is the same whatever the number of processes.
+        See :meth:`par_map` for *executor*.
+        
+        >>> Pipeline(range(10)).par_shuffle(seed=1234, block=4, processes=2)
+        (2, 0, 7, 5, 9, 3, 1, 4, 8, 6)
         """
-        return self.sample(self.len())
+        if block < 1:
+            raise ValueError("Block size must be positive")
+        seed = sampling.new_seed(seed)
+        count = max(1, math.ceil(len(self) / block))
+        buckets: list[list[T_co]] = [[] for _ in range(count)]
+        items = iter(self)
+        for index, start in enumerate(range(0, len(self), block)):
+            scatter = sampling.stream(seed, "scatter", index).choices(range(count), k=min(block, len(self) - start))
+            for bucket, item in zip(scatter, items):
+                buckets[bucket].append(item)
+        fn = functools.partial(sampling.shuffle_bucket, seed)
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            return Pipeline(itertools.chain.from_iterable(pool.map(remote, enumerate(buckets), 1)))
+
+    @staticmethod
+    def reservoir_sample(items: Iterable[T], n: int, seed: Seed | None = None, 
+                         weight: Callable[[T], float] | None = None) -> Pipeline[T]:
+        """Select *n* random elements without replacement from *items* in one pass, 
+        e.g. from a file or a generator too large to make into a Pipeline. 
+        Only the sample is kept in memory. With a *weight* function, each element is picked 
+        with a probability proportional to its weight. If there are fewer than *n* elements, all of them are returned.
+        
+        >>> Pipeline.reservoir_sample(iter(range(1_000_000)), 3, seed=1234)
+        (508180, 574901, 100406)
+        """
+        return Pipeline(sampling.reservoir(items, n, random.Random(sampling.new_seed(seed)), weight))
     
     # === Terminal methods ===
 
@@ -621,25 +1194,33 @@ class Pipeline(tuple[T_co, ...]):
         """
         return functools.reduce(fn, self, initial)
 
-    def reduce_non_empty(self, fn: Callable[[T_co, T_co], T_co]) -> T_co:
+    def reduce_non_empty(self, fn: Callable[[T_co, T_co], T_co], parallel: Parallel = False) -> T_co:
         """Reduce a non-empty pipeline to a single value using *fn*.
+        With *parallel*, which works as in :meth:`map`, *fn* must be associative 
+        because the elements are combined as in :meth:`par_reduce_non_empty`.
         
         >>> Pipeline([1, 2, 3]).reduce_non_empty(lambda acc, x: acc + x)
         6
         """
         if self.is_empty():
             raise ValueError("Pipeline is empty")
-        return functools.reduce(fn, self)
+        if parallel is False:
+            return functools.reduce(fn, self)
+        if parallel is True:
+            return self.par_reduce_non_empty(fn)
+        return auto_parallel(parallel).reduce(fn, self)
 
     def par_reduce_non_empty(
         self,
         fn: Callable[[T_co, T_co], T_co],
         processes: int | None = None,
         maxtasksperchild: int | None = None,
-        chunksize: int | None = None) -> T_co:
+        chunksize: int | None = None,
+        executor: Executor | None = None) -> T_co:
         """
         Parallel binary-tree reduction. O(log n)
         *fn* must be picklable (no lambdas).
+        See :meth:`par_map` for *executor*.
 
         >>> from operator import add
         >>> Pipeline("Parallelism!").par_reduce_non_empty(add, processes=2)
@@ -648,18 +1229,43 @@ class Pipeline(tuple[T_co, ...]):
         if self.is_empty():
             raise ValueError("Pipeline is empty")
 
-        values = list(self)
-        with Pool(processes=processes, maxtasksperchild=maxtasksperchild) as pool:
-            while len(values) > 1:
-                # pairwise grouping: (v0,v1), (v2,v3), ...
-                pairs = list(zip(values[::2], values[1::2]))
-                # reduce each pair in parallel
-                reduced = pool.starmap(fn, pairs, chunksize) if pairs else []
-                # carry over the last element if the list length was odd
-                if len(values) % 2 == 1:
-                    reduced.append(values[-1])
-                values = reduced
-        return values[0]
+        with open_executor(processes, maxtasksperchild, executor, fn) as (pool, remote):
+            return tree_reduce(pool, remote, list(self), chunksize)
+
+    def scan(self, fn: Callable[[V, T_co], V], initial: V) -> Pipeline[V]:
+        """Return the running results of :meth:`reduce`, starting with *initial* (like :func:`itertools.accumulate`).
+        
+        >>> from operator import add
+        >>> Pipeline([1, 2, 3, 4]).scan(add, 0)
+        (0, 1, 3, 6, 10)
+        """
+        return Pipeline(itertools.accumulate(self, fn, initial=initial))
+
+    def par_scan(self, fn: Callable[[T_co, T_co], T_co],
+                 processes: int | None = None,
+                 maxtasksperchild: int | None = None,
+                 chunksize: int | None = None,
+                 executor: Executor | None = None) -> Pipeline[T_co]:
+        """Return the running results of :meth:`reduce_non_empty` (an inclusive scan) in parallel.
+        *fn* must be associative, because the elements are scanned in blocks of *chunksize* 
+        that are combined with the totals of the blocks before them (see :func:`~oa_utils.parallel.prefix_scan`).
+        *fn* must be picklable, so it can't be a lambda function. See :meth:`par_map` for *executor*.
+        By default there are four blocks per process. The size of an *executor* isn't known,
+        so a *chunksize* is required with one.
+        
+        >>> from operator import add
+        >>> Pipeline(range(1, 11)).par_scan(add, processes=2, chunksize=3)
+        (1, 3, 6, 10, 15, 21, 28, 36, 45, 55)
+        """
+        if chunksize is not None and chunksize < 1:
+            raise ValueError("Chunksize must be positive")
+        if executor is not None and chunksize is None:
+            raise ValueError("par_scan needs a chunksize with an executor")
+        if self.is_empty():
+            return Pipeline([])
+        block_fn = functools.partial(prefix_block, fn)
+        with open_executor(processes, maxtasksperchild, executor, block_fn) as (pool, remote):
+            return Pipeline(prefix_scan(pool, fn, remote, self, chunksize, processes or os.cpu_count() or 1))
 
     def len(self) -> int:
         """Return the length of the pipeline.
@@ -669,6 +1275,17 @@ class Pipeline(tuple[T_co, ...]):
         """
         return len(self)
     
+    def memory_usage(self, deep: bool = False) -> int:
+        """Return the size of the pipeline in bytes. With *deep*, include the elements and
+        everything reachable from them (see :func:`~oa_utils.memory.deep_sizeof`), such as the subgroups
+        of :meth:`group_by`. An element that appears more than once is counted once.
+        
+        >>> p = Pipeline(["a" * 1000] * 3)
+        >>> p.memory_usage(deep=True) - p.memory_usage() > 1000
+        True
+        """
+        return deep_sizeof(self) if deep else sys.getsizeof(self)
+
     def min(self) -> T_co:
         """Return the minimum element.
         
@@ -703,6 +1320,60 @@ class Pipeline(tuple[T_co, ...]):
             raise ValueError("Pipeline is empty")
         return sum(self) / len(self) # type: ignore
     
+    @overload
+    def aggregate(self, *, by: None = None, **aggs: str | Aggregator) -> dict[str, Any]: ...
+    @overload
+    def aggregate(self, *, by: Callable[[T_co], K], **aggs: str | Aggregator) -> dict[K, dict[str, Any]]: ...
+    def aggregate(self, *, by: Callable[[T_co], K] | None = None, 
+                  **aggs: str | Aggregator) -> dict[str, Any] | dict[K, dict[str, Any]]:
+        """Compute any number of named aggregates in a single pass and return them as a dict.
+        Each aggregate is an :class:`~oa_utils.aggregates.Aggregator` or the name of one: 
+        ``"count"``, ``"sum"``, ``"min"``, ``"max"`` or ``"mean"`` (``"avg"``).
+        With *by*, return a dict of such dicts per key instead, in order of first appearance.
+        The min, max and mean of no elements are None. An aggregate can't be named ``by``.
+        
+        >>> Pipeline([3, 1, 2]).aggregate(n="count", total="sum", lo="min", hi="max", mean="mean")
+        {'n': 3, 'total': 6, 'lo': 1, 'hi': 3, 'mean': 2.0}
+        
+        >>> Pipeline([3, 1, 2]).aggregate(by=is_even, total="sum")
+        {False: {'total': 4}, True: {'total': 2}}
+        """
+        resolved = aggregates.resolve(aggs, by=by)
+        return aggregates.finish(resolved, by, aggregates.fold(resolved, by, self)) # type: ignore[no-any-return]
+
+    @overload
+    def par_aggregate(self, *, by: None = None, processes: int | None = None,
+                      maxtasksperchild: int | None = None, chunksize: int | None = None,
+                      executor: Executor | None = None, **aggs: str | Aggregator) -> dict[str, Any]: ...
+    @overload
+    def par_aggregate(self, *, by: Callable[[T_co], K], processes: int | None = None,
+                      maxtasksperchild: int | None = None, chunksize: int | None = None,
+                      executor: Executor | None = None, **aggs: str | Aggregator) -> dict[K, dict[str, Any]]: ...
+    def par_aggregate(self, *, by: Callable[[T_co], K] | None = None, 
+                      processes: int | None = None,
+                      maxtasksperchild: int | None = None, 
+                      chunksize: int | None = None,
+                      executor: Executor | None = None, 
+                      **aggs: str | Aggregator) -> dict[str, Any] | dict[K, dict[str, Any]]:
+        """Compute the aggregates of :meth:`aggregate` in parallel. Each worker folds its chunks 
+        into partial states, which are merged in order. By default there is one chunk per process.
+        *by* and the aggregators must be picklable. See :meth:`par_map` for the other parameters,
+        whose names an aggregate can't have either.
+        
+        >>> Pipeline(range(1, 101)).par_aggregate(processes=2, total="sum", hi="max")
+        {'total': 5050, 'hi': 100}
+        """
+        resolved = aggregates.resolve(aggs, by=by, processes=processes, maxtasksperchild=maxtasksperchild,
+                                      chunksize=chunksize, executor=executor)
+        if chunksize is not None and chunksize < 1:
+            raise ValueError("Chunksize must be positive")
+        size = chunksize or max(1, math.ceil(len(self) / (processes or os.cpu_count() or 1)))
+        chunks = [self[i:i + size] for i in range(0, len(self), size)]
+        with open_executor(processes, maxtasksperchild, executor, 
+                           functools.partial(aggregates.fold, resolved, by)) as (pool, remote):
+            folds = pool.map(remote, chunks, 1)
+        return aggregates.finish(resolved, by, aggregates.merge_all(resolved, by, folds)) # type: ignore[no-any-return]
+
     def any(self) -> bool:
         """Return True if any element is True.
         
@@ -764,7 +1435,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> values
         (('Alice',), ('Bob',), ('Charlie',))
         """
-        return Pipeline(self).map(lambda x: x[0]), Pipeline(self).map(lambda x: x[1])
+        return Pipeline(map(operator.itemgetter(0), self)), Pipeline(map(operator.itemgetter(1), self))
 
     # === Dunder methods ===
     
@@ -774,7 +1445,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2]) + [3, 4]
         (1, 2, 3, 4)
         """
-        return Pipeline(self.to_list() + list(other)) 
+        return self.extend(other)
 
     def __radd__(self, other: Iterable[T_co]) -> Pipeline[T_co]: # type: ignore
         """Concatenate with another iterable (right addition).
@@ -782,7 +1453,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> [1, 2] + Pipeline([3, 4])
         (1, 2, 3, 4)
         """
-        return Pipeline(list(other) + self.to_list())
+        return Pipeline(itertools.chain(other, self))
 
     def __mul__(self, n: int) -> Pipeline[T_co]: # type: ignore
         """Repeat the pipeline *n* times.
@@ -790,7 +1461,7 @@ class Pipeline(tuple[T_co, ...]):
         >>> Pipeline([1, 2]) * 2
         (1, 2, 1, 2)
         """
-        return Pipeline(self.to_list() * n)
+        return self if n == 1 else Pipeline(tuple.__mul__(self, n))
  
     def __rmul__(self, n: int) -> Pipeline[T_co]: # type: ignore
         """Repeat the pipeline *n* times (right multiplication).
@@ -800,6 +1471,181 @@ class Pipeline(tuple[T_co, ...]):
         """
         return self * n
 
+# === Indexes ===
+
+class SortedIndex(Generic[T]):
+    """Elements sorted by *key* supporting :mod:`bisect`-based range queries.
+    Elements with equal keys keep their original order. Create with :meth:`Pipeline.sorted_index`.
+    
+    >>> index = Pipeline(['Bob', 'Alice', 'Roger', 'Al']).sorted_index(len)
+    >>> index.eq(5)
+    ('Alice', 'Roger')
+    >>> index.ge(5)
+    ('Alice', 'Roger')
+    >>> index.gt(2)
+    ('Bob', 'Alice', 'Roger')
+    >>> index.le(3)
+    ('Al', 'Bob')
+    """
+
+    def __init__(self, items: Iterable[T], key: Callable[[T], Any]) -> None:
+        pairs = sorted(((key(item), item) for item in items), key=lambda pair: pair[0])
+        self._keys = [k for k, _ in pairs]
+        self._items = Pipeline(item for _, item in pairs)
+
+    def between(self, lo: Any, hi: Any) -> Pipeline[T]:
+        """Return the elements with *lo* <= key <= *hi*."""
+        return self._items.slice(bisect_left(self._keys, lo), bisect_right(self._keys, hi))
+
+    def eq(self, k: Any) -> Pipeline[T]:
+        """Return the elements with key == *k*."""
+        return self.between(k, k)
+
+    def lt(self, k: Any) -> Pipeline[T]:
+        """Return the elements with key < *k*."""
+        return self._items.take(bisect_left(self._keys, k))
+
+    def le(self, k: Any) -> Pipeline[T]:
+        """Return the elements with key <= *k*."""
+        return self._items.take(bisect_right(self._keys, k))
+
+    def gt(self, k: Any) -> Pipeline[T]:
+        """Return the elements with key > *k*."""
+        return self._items.drop(bisect_right(self._keys, k))
+
+    def ge(self, k: Any) -> Pipeline[T]:
+        """Return the elements with key >= *k*."""
+        return self._items.drop(bisect_left(self._keys, k))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+class SortedPipeline(Pipeline[T_co]):
+    """A Pipeline sorted by *key* (the elements themselves if None), in descending order if *reverse*
+    (remembered as :attr:`descending`).
+    Lookups use the order: :meth:`min` and :meth:`max` are O(1) and ``in`` and :meth:`find` bisect.
+    :meth:`unique` and :meth:`group_by` scan adjacent runs instead of hashing.
+    Other methods return plain Pipelines. Create with :meth:`Pipeline.sort` and ``remember=True``.
+    
+    >>> words = Pipeline(['Bob', 'Alice', 'Roger', 'Al']).sort(len, remember=True)
+    >>> words.find(5)
+    ('Alice', 'Roger')
+    >>> words.group_by(len)
+    ((2, ('Al',)), (3, ('Bob',)), (5, ('Alice', 'Roger')))
+    """
+    key: Callable[[Any], Any] | None
+    descending: bool
+
+    def __new__(cls, items: Iterable[T_co] = (), key: Callable[[T_co], Any] | None = None, 
+                reverse: bool = False) -> SortedPipeline[T_co]:
+        self = super().__new__(cls, sorted(items, key=key, reverse=reverse)) # type: ignore
+        self.key = key
+        self.descending = reverse
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Pickle and copy without sorting again, which would use the natural ascending order
+        return _rebuild_sorted, (type(self), tuple(self), self.key, self.descending)
+
+    def _bounds(self, k: Any) -> tuple[int, int]:
+        """Return the range of the elements with key == *k*."""
+        key: Callable[[Any], Any] = (lambda item: item) if self.key is None else self.key
+        lo, hi = 0, len(self)
+        while lo < hi: # First element that doesn't come before k
+            mid = (lo + hi) // 2
+            if (k < key(self[mid])) if self.descending else (key(self[mid]) < k):
+                lo = mid + 1
+            else:
+                hi = mid
+        end = len(self)
+        while lo < end: # First element that comes after k
+            mid = (lo + end) // 2
+            if (key(self[mid]) < k) if self.descending else (k < key(self[mid])):
+                end = mid
+            else:
+                lo = mid + 1
+        return hi, end
+
+    def find(self, k: Any) -> Pipeline[T_co]:
+        """Return the elements with key == *k* in O(log n).
+        
+        >>> Pipeline([3, 1, 2, 1]).sort(remember=True).find(1)
+        (1, 1)
+        """
+        start, end = self._bounds(k)
+        return Pipeline(self[start:end])
+
+    def __contains__(self, item: object) -> bool:
+        try:
+            start, end = self._bounds(item if self.key is None else self.key(item))
+        except (TypeError, KeyError, IndexError, AttributeError): # The key doesn't apply to it, so not an element
+            return False
+        return any(x == item for x in self[start:end])
+
+    def min(self) -> T_co:
+        """Return the minimum element, in O(1) if the pipeline is sorted by the elements themselves.
+        
+        >>> Pipeline([3, 1, 2]).sort(reverse=True, remember=True).min()
+        1
+        """
+        if self.key is not None or not self:
+            return super().min()
+        return self[-1] if self.descending else self[0]
+
+    def max(self) -> T_co:
+        """Return the maximum element, in O(1) if the pipeline is sorted by the elements themselves.
+        
+        >>> Pipeline([3, 1, 2]).sort(remember=True).max()
+        3
+        """
+        if self.key is not None or not self:
+            return super().max()
+        return self[0] if self.descending else self[-1]
+
+    def unique(self) -> Pipeline[T_co]:
+        """Remove duplicates, in one pass over adjacent runs if the pipeline is sorted by the elements themselves.
+        The result is a SortedPipeline.
+        
+        >>> Pipeline([2, 1, 2, 1]).sort(remember=True).unique()
+        (1, 2)
+        """
+        if self.key is not None:
+            return SortedPipeline(super().unique(), self.key, self.descending)
+        return self._sorted(k for k, _ in itertools.groupby(self))
+
+    def group_by(self, key: Callable[[T_co], K]) -> Pipeline[tuple[K, Pipeline[T_co]]]:
+        """Group the elements by *key* like :meth:`Pipeline.group_by`, streaming over adjacent runs
+        if *key* is the key the pipeline is sorted by.
+        
+        >>> Pipeline(['Bob', 'Al', 'Alice']).sort(len, remember=True).group_by(len)
+        ((2, ('Al',)), (3, ('Bob',)), (5, ('Alice',)))
+        """
+        if key is not self.key:
+            return super().group_by(key)
+        return Pipeline((k, Pipeline(run)) for k, run in itertools.groupby(self, key))
+
+    def merge(self, other: SortedPipeline[T_co]) -> SortedPipeline[T_co]:
+        """Merge with *other*, which must be sorted the same way, in linear time.
+        
+        >>> Pipeline([1, 4]).sort(remember=True).merge(Pipeline([3, 2]).sort(remember=True))
+        (1, 2, 3, 4)
+        """
+        if not isinstance(other, SortedPipeline) or (other.key, other.descending) != (self.key, self.descending):
+            raise ValueError("Can only merge SortedPipelines with the same key and direction")
+        return self._sorted(heapq.merge(self, other, key=self.key, reverse=self.descending)) # type: ignore
+
+    def _sorted(self, items: Iterable[T_co]) -> SortedPipeline[T_co]:
+        # Sorting already sorted items is a linear pass
+        return SortedPipeline(items, self.key, self.descending)
+
+def _rebuild_sorted(cls: type[SortedPipeline[T]], items: tuple[T, ...], key: Callable[[T], Any] | None,
+                    descending: bool) -> SortedPipeline[T]:
+    """Recreate a pickled or copied :class:`SortedPipeline` from its items, which are already in order."""
+    self = tuple.__new__(cls, items)
+    self.key = key
+    self.descending = descending
+    return self
+
 # === Helpers ===
 
 def square(x: float) -> float:
@@ -810,6 +1656,10 @@ def swallow(x: Any) -> None:
     """Used for testing."""
     pass
 
+def is_even(x: int) -> bool:
+    """Used for testing."""
+    return x % 2 == 0
+
 def shuffle_batch(batch: Pipeline[int], seed: int) -> Pipeline[int]:
     """Used for tesing."""
     random.seed(seed)
@@ -833,6 +1683,26 @@ def unpack(fn: Callable[[T, U], V]) -> Callable[[tuple[T, U]], V]:
         return fn(a, b)
     return wrapper
 
+def argmin(values: Iterable[Any]) -> int:
+    """Return the index of the smallest of the non-empty *values* (the first one on ties).
+    
+    >>> argmin([3, 1, 2, 1])
+    1
+    """
+    return min(enumerate(values), key=operator.itemgetter(1))[0]
+
+def argmax(values: Iterable[Any]) -> int:
+    """Return the index of the largest of the non-empty *values* (the first one on ties).
+    
+    >>> argmax([1, 3, 2, 3])
+    1
+    """
+    return max(enumerate(values), key=operator.itemgetter(1))[0]
+
+def _pipeline_bytes(n: int) -> int:
+    """Return the size of a Pipeline of *n* elements, not counting the elements."""
+    return sys.getsizeof(Pipeline()) + n * POINTER_BYTES
+
 if __name__ == "__main__":
     # Interpreter usage: 
     # from importlib import reload; import oa_utils; reload(oa_utils); from oa_utils import Pipeline, unpack
@@ -0,0 +1,70 @@
+"""Incremental rolling aggregates used by :meth:`oa_utils.Pipeline.rolling`.
+Each function yields the aggregate of every window of *n* consecutive values in O(1) amortized time per window.
+Floating point sums are recomputed from scratch once every *n* windows, so rounding errors don't accumulate."""
+from __future__ import annotations
+from collections import deque
+from typing import Any, Iterator, Sequence
+
+def rolling_sum(values: Sequence[Any], n: int) -> Iterator[Any]:
+    """Yield the sum of every window of *n* values."""
+    if len(values) < n:
+        return
+    total = sum(values[:n])
+    yield total
+    for i in range(n, len(values)):
+        if i % n == 0:
+            total = sum(values[i - n + 1:i + 1])
+        else:
+            total += values[i] - values[i - n]
+        yield total
+
+def rolling_mean(values: Sequence[Any], n: int) -> Iterator[float]:
+    """Yield the mean of every window of *n* values."""
+    for total in rolling_sum(values, n):
+        yield total / n
+
+def rolling_min(values: Sequence[Any], n: int) -> Iterator[Any]:
+    """Yield the minimum of every window of *n* values using a monotonic deque."""
+    window: deque[int] = deque() # Indices of increasing values
+    for i, value in enumerate(values):
+        while window and values[window[-1]] >= value:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - n:
+            window.popleft()
+        if i >= n - 1:
+            yield values[window[0]]
+
+def rolling_max(values: Sequence[Any], n: int) -> Iterator[Any]:
+    """Yield the maximum of every window of *n* values using a monotonic deque."""
+    window: deque[int] = deque() # Indices of decreasing values
+    for i, value in enumerate(values):
+        while window and values[window[-1]] <= value:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - n:
+            window.popleft()
+        if i >= n - 1:
+            yield values[window[0]]
+
+def rolling_var(values: Sequence[Any], n: int) -> Iterator[float]:
+    """Yield the sample variance of every window of *n* >= 2 values using Welford's algorithm,
+    replacing the oldest value with the newest one at every step."""
+    if len(values) < n:
+        return
+    mean, m2 = _mean_and_m2(values[:n])
+    yield m2 / (n - 1)
+    for i in range(n, len(values)):
+        if i % n == 0:
+            mean, m2 = _mean_and_m2(values[i - n + 1:i + 1])
+        else:
+            old, new = values[i - n], values[i]
+            delta = new - old
+            old_mean = mean
+            mean += delta / n
+            m2 += delta * (new - mean + old - old_mean)
+        yield max(m2, 0.0) / (n - 1)
+
+def _mean_and_m2(window: Sequence[Any]) -> tuple[float, float]:
+    mean = sum(window) / len(window)
+    return mean, sum((x - mean) ** 2 for x in window)
@@ -0,0 +1,116 @@
+"""Seeded random streams and sampling used by :meth:`oa_utils.Pipeline.sample`,
+:meth:`oa_utils.Pipeline.par_shuffle` and friends.
+
+The parallel methods split the elements into fixed-size blocks and give every block its own
+:class:`random.Random` stream, derived from the seed and the index of the block with :func:`stream`.
+The results then depend on the seed and the block size, but not on the number of processes
+or on which worker gets which block.
+
+Weighted sampling without replacement uses the keys of Efraimidis and Spirakis:
+every element draws ``log(u) / weight`` for a uniform *u*, and the elements with the largest keys win.
+
+>>> from oa_utils import Pipeline
+>>> Pipeline(range(10)).par_sample(3, seed=42, block=4, processes=2) == Pipeline(range(10)).par_sample(3, seed=42, block=4, processes=1)
+True
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import math
+import random
+import sys
+from typing import Any, Callable, Iterable, Iterator, Sequence, TypeVar
+
+T = TypeVar("T")
+
+Seed = int | str | bytes
+
+def stream(seed: Seed, *path: object) -> random.Random:
+    """Return the random stream named *path* under *seed*, independent of the other paths.
+
+    >>> stream(42, "block", 0).random() == stream(42, "block", 0).random() != stream(42, "block", 1).random()
+    True
+    """
+    return random.Random("/".join(map(repr, (seed, *path))))
+
+def new_seed(seed: Seed | None) -> Seed:
+    """Return *seed*, or a new one drawn from the global random state if it's None,
+    so seeding the :mod:`random` module still makes the results repeatable."""
+    return random.getrandbits(64) if seed is None else seed
+
+def _unit(rng: random.Random) -> float:
+    """Return a uniform random number strictly between 0 and 1."""
+    return rng.random() or sys.float_info.min
+
+def keys(rng: random.Random, weights: Iterable[float]) -> Iterator[float]:
+    """Yield the sampling key of every element with *weights*. Elements of weight 0 get -inf, so they're never picked."""
+    for weight in weights:
+        if weight < 0:
+            raise ValueError("Weights must not be negative")
+        yield math.log(_unit(rng)) / weight if weight > 0 else -math.inf
+
+def weighted_sample(items: Sequence[T], n: int, weights: Sequence[float], rng: random.Random) -> list[T]:
+    """Select *n* of *items* without replacement, each with a probability proportional to its weight.
+
+    >>> weighted_sample('abc', 2, [1, 0, 1], random.Random(0))
+    ['a', 'c']
+    """
+    if len(weights) != len(items):
+        raise ValueError("Expected one weight per element")
+    drawn = list(keys(rng, weights))
+    if not 0 <= n <= sum(key > -math.inf for key in drawn):
+        raise ValueError("Sample larger than the elements with a positive weight, or negative")
+    return [items[i] for i in heapq.nlargest(n, range(len(items)), key=drawn.__getitem__)]
+
+def block_sample(seed: Seed, n: int, block: tuple[int, int, int | Sequence[float]]) -> list[tuple[float, int]]:
+    """Return the *n* largest (key, index) pairs of a block given as its index, its first index
+    in the elements and its length (all weights 1) or its weights."""
+    index, start, weights = block
+    drawn = keys(stream(seed, "sample", index), itertools.repeat(1.0, weights) if isinstance(weights, int) else weights)
+    return heapq.nlargest(n, ((key, start + i) for i, key in enumerate(drawn) if key > -math.inf))
+
+def shuffle_bucket(seed: Seed, bucket: tuple[int, list[T]]) -> list[T]:
+    """Shuffle a bucket given as its index and its elements with the bucket's own stream."""
+    index, items = bucket
+    stream(seed, "shuffle", index).shuffle(items)
+    return items
+
+def reservoir(items: Iterable[T], n: int, rng: random.Random, weight: Callable[[T], float] | None = None) -> list[T]:
+    """Select *n* of *items* without replacement in one pass, keeping only the sample in memory.
+    Without a *weight* function, this is Li's Algorithm L, which draws a random number only for the
+    elements it keeps, and the elements of the sample are in no particular order. With one, every element
+    draws a key and the sample is ordered from the largest key down, like :func:`weighted_sample`.
+
+    >>> sorted(reservoir(iter(range(100)), 3, random.Random(0)))
+    [37, 46, 65]
+    """
+    if n < 0:
+        raise ValueError("Sample size must not be negative")
+    if n == 0:
+        return []
+    it = iter(items)
+    if weight is not None:
+        # Keep the n largest keys in a min-heap; the index breaks ties without comparing the elements
+        heap: list[tuple[float, int, T]] = []
+        for i, item in enumerate(it):
+            key = next(keys(rng, [weight(item)]))
+            if key == -math.inf:
+                continue
+            if len(heap) < n:
+                heapq.heappush(heap, (key, i, item))
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, (key, i, item))
+        return [item for _, _, item in sorted(heap, reverse=True)]
+    sample = list(itertools.islice(it, n))
+    if len(sample) < n:
+        return sample
+    w = math.exp(math.log(_unit(rng)) / n)
+    while True:
+        skip = math.floor(math.log(_unit(rng)) / math.log1p(-w)) if w < 1 else 0
+        item = next(itertools.islice(it, skip, None), _MISSING)
+        if item is _MISSING:
+            return sample
+        sample[rng.randrange(n)] = item
+        w *= math.exp(math.log(_unit(rng)) / n)
+
+_MISSING: Any = object()
@@ -0,0 +1,60 @@
+"""Order-preserving set operations used by :meth:`oa_utils.Pipeline.intersect` and friends.
+
+An operation is a triple of flags that say which distinct elements to keep: those of the left side
+that are also on the right side, those only on the left side, and those only on the right side.
+Elements are compared by *key*, or by themselves if *key* is None, and only the first element
+with a given key on each side is kept.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+SetOp = tuple[bool, bool, bool]
+
+INTERSECT: SetOp = (True, False, False)
+DIFFERENCE: SetOp = (False, True, False)
+UNION: SetOp = (True, True, True)
+SYMMETRIC_DIFFERENCE: SetOp = (False, True, True)
+
+def hash_setop(op: SetOp, key: Callable[[Any], Any] | None,
+               xs: Iterable[tuple[int, Any]], ys: Iterable[tuple[int, Any]]) -> tuple[list[int], list[int]]:
+    """Return the indices of the elements to keep from the left (index, element) pairs *xs* and
+    from the right pairs *ys*, using hash tables of the keys."""
+    both, left_only, right_only = op
+    right: dict[Any, int] = {}
+    for j, y in ys:
+        right.setdefault(y if key is None else key(y), j)
+    left = set()
+    kept_left = []
+    for i, x in xs:
+        k = x if key is None else key(x)
+        if k in left:
+            continue
+        left.add(k)
+        if both if k in right else left_only:
+            kept_left.append(i)
+    kept_right = [j for k, j in right.items() if k not in left] if right_only else []
+    return kept_left, kept_right
+
+def merge_setop(op: SetOp, key: Callable[[Any], Any] | None, xs: Sequence[Any], ys: Sequence[Any]) -> Iterator[Any]:
+    """Yield the elements to keep from *xs* and *ys*, which are both sorted in ascending order of *key*,
+    in one linear merge without hashing. The result is sorted too."""
+    both, left_only, right_only = op
+    keys: Callable[[Any], Any] = (lambda x: x) if key is None else key
+    i = j = 0
+    while i < len(xs) or j < len(ys):
+        if j == len(ys):
+            k, take_left, take_right = keys(xs[i]), True, False
+        elif i == len(xs):
+            k, take_left, take_right = keys(ys[j]), False, True
+        else:
+            kx, ky = keys(xs[i]), keys(ys[j])
+            k, take_left, take_right = (kx, True, False) if kx < ky else (ky, False, True) if ky < kx else (kx, True, True)
+        if take_left and (both if take_right else left_only):
+            yield xs[i]
+        elif take_right and not take_left and right_only:
+            yield ys[j]
+        # Skip the duplicates of k on both sides
+        while take_left and i < len(xs) and keys(xs[i]) == k:
+            i += 1
+        while take_right and j < len(ys) and keys(ys[j]) == k:
+            j += 1
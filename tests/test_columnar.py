@@ -0,0 +1,80 @@
+from oa_utils import Pipeline, ColumnarPipeline, Vector2, col
+from collections import namedtuple
+from typing import Any
+from typing_extensions import assert_type
+import pytest
+
+people = ColumnarPipeline({'name': ['Alice', 'Bob', 'Eve', 'Dan'], 'age': [30, 25, 35, 25]})
+
+def test_init() -> None:
+    assert people.columns == ('name', 'age')
+    assert len(people) == 4
+    assert len(ColumnarPipeline({})) == 0
+    with pytest.raises(ValueError):
+        ColumnarPipeline({'a': [1, 2], 'b': [1]})
+
+def test_from_rows() -> None:
+    rows = Pipeline([{'name': 'Alice', 'age': 30}, {'name': 'Bob', 'age': 25}])
+    assert ColumnarPipeline.from_rows(rows) == ColumnarPipeline({'name': ['Alice', 'Bob'], 'age': [30, 25]})
+    assert ColumnarPipeline.from_rows(rows, ['age']) == ColumnarPipeline({'age': [30, 25]})
+    vectors = ColumnarPipeline.from_rows([Vector2(1.0, 2.0), Vector2(3.0, 4.0)])
+    assert vectors == ColumnarPipeline({'x': [1.0, 3.0], 'y': [2.0, 4.0]})
+    Point = namedtuple('Point', ['x', 'y'])
+    assert ColumnarPipeline.from_rows([Point(1, 2)]) == ColumnarPipeline({'x': [1], 'y': [2]})
+    assert ColumnarPipeline.from_rows([], ['x']) == ColumnarPipeline({'x': []})
+
+def test_to_rows() -> None:
+    rows = people.to_rows()
+    assert rows[0] == {'name': 'Alice', 'age': 30}
+    assert ColumnarPipeline.from_rows(rows) == people
+    assert_type(rows, Pipeline[Any])
+    vectors = Pipeline([Vector2(1.0, 2.0), Vector2(3.0, 4.0)])
+    assert ColumnarPipeline.from_rows(vectors).to_rows(Vector2) == vectors
+
+def test_column() -> None:
+    ages = people.column('age')
+    assert ages == (30, 25, 35, 25)
+    assert_type(ages, Pipeline[Any])
+
+def test_select() -> None:
+    assert people.select('age').columns == ('age',)
+    assert people.select('age').column('age') is people.column('age')
+
+def test_filter() -> None:
+    adults = people.filter('age', lambda age: age >= 30)
+    assert adults == ColumnarPipeline({'name': ['Alice', 'Eve'], 'age': [30, 35]})
+
+def test_where() -> None:
+    adults = people.where((col('age') >= 30) & (col('name') != 'Eve'))
+    assert adults == ColumnarPipeline({'name': ['Alice'], 'age': [30]})
+
+def test_with_column() -> None:
+    table = people.with_column('decade', col('age') // 10)
+    assert table.columns == ('name', 'age', 'decade')
+    assert table.column('decade') == (3, 2, 3, 2)
+    assert people.with_column('age', col('age') + 1).column('age') == (31, 26, 36, 26)
+
+def test_numpy_columns() -> None:
+    np = pytest.importorskip("numpy")
+    table = ColumnarPipeline({'x': np.array([1.0, 2.0, 3.0]), 'name': ['a', 'b', 'c']})
+    # Float arrays take the vector path, so division by zero follows numpy, not Python
+    with np.errstate(divide="ignore"):
+        table = table.with_column('inv', 1 / (col('x') - 2))
+    assert table.column('inv') == (-1.0, float('inf'), 1.0)
+    big = table.where(col('x') > 1.5)
+    assert big.column('name') == ('b', 'c')
+    assert big == ColumnarPipeline({'x': np.array([2.0, 3.0]), 'name': ['b', 'c'], 'inv': [float('inf'), 1.0]})
+    assert table.sort('x', reverse=True).column('x') == (3.0, 2.0, 1.0)
+
+def test_sort() -> None:
+    assert people.sort('age').column('name') == ('Bob', 'Dan', 'Alice', 'Eve')
+    assert people.sort('age', reverse=True).column('name') == ('Eve', 'Alice', 'Bob', 'Dan')
+
+def test_group_by() -> None:
+    groups = people.group_by('age')
+    assert groups.map(lambda group: group[0]) == (30, 25, 35)
+    assert groups[1][1] == ColumnarPipeline({'name': ['Bob', 'Dan'], 'age': [25, 25]})
+    assert_type(groups, Pipeline[tuple[Any, ColumnarPipeline]])
+
+def test_to_table() -> None:
+    assert people.to_table() == people.to_rows().to_table()
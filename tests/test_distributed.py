@@ -0,0 +1,82 @@
+from oa_utils import Pipeline, DistributedExecutor, WorkerLostError, square
+from operator import add
+from typing import Iterator
+from typing_extensions import assert_type
+from pathlib import Path
+import functools
+import os
+import pytest
+
+def exit_on(n: int, marker: str, x: int) -> int:
+    """Kill the worker the first time it sees *n*."""
+    if x == n and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return x * x
+
+def always_exit(x: int) -> int:
+    os._exit(1)
+
+def fail(x: int) -> int:
+    raise ValueError(x)
+
+@pytest.fixture
+def executor() -> Iterator[DistributedExecutor]:
+    with DistributedExecutor(timeout=30) as executor:
+        executor.spawn_local_workers(2)
+        yield executor
+
+def test_par_map(executor: DistributedExecutor) -> None:
+    p = Pipeline(range(1, 11)).par_map(square, executor=executor, chunksize=3)
+    assert p == (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+    assert_type(p, Pipeline[float])
+
+def test_par_map_checkpoint(executor: DistributedExecutor, tmp_path: Path) -> None:
+    p = Pipeline(range(1, 11)).par_map(square, executor=executor, chunksize=3, checkpoint_dir=tmp_path)
+    assert p == (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+    assert len(list(tmp_path.glob("chunk-*.pkl"))) == 4
+    assert Pipeline(range(1, 11)).par_map(square, executor=executor, chunksize=3, checkpoint_dir=tmp_path) == p
+
+def test_par_zip_with(executor: DistributedExecutor) -> None:
+    p = Pipeline([1, 2, 3]).par_zip_with(add, [10, 20, 30], executor=executor)
+    assert p == (11, 22, 33)
+    assert_type(p, Pipeline[int])
+
+def test_par_reduce_non_empty(executor: DistributedExecutor) -> None:
+    res = Pipeline("Parallelism!").par_reduce_non_empty(add, executor=executor)
+    assert res == "Parallelism!"
+    assert_type(res, str)
+
+def test_retry_on_worker_loss(executor: DistributedExecutor, tmp_path: str) -> None:
+    fn = functools.partial(exit_on, 5, os.path.join(tmp_path, "marker"))
+    p = Pipeline(range(1, 11)).par_map(fn, executor=executor, chunksize=2)
+    assert p == (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+    assert len(executor.workers) == 1
+
+def test_too_many_retries() -> None:
+    with DistributedExecutor(max_retries=1, timeout=30) as executor:
+        executor.spawn_local_workers(2)
+        with pytest.raises(WorkerLostError):
+            Pipeline([1]).par_map(always_exit, executor=executor)
+
+def test_all_workers_lost() -> None:
+    # With the default timeout, the executor must not wait forever for a worker
+    with DistributedExecutor() as executor:
+        executor.spawn_local_workers(2)
+        with pytest.raises(WorkerLostError):
+            Pipeline(range(10)).par_map(always_exit, executor=executor)
+
+def test_error(executor: DistributedExecutor) -> None:
+    with pytest.raises(ValueError):
+        Pipeline([1, 2, 3]).par_map(fail, executor=executor)
+    # The executor is still usable after an error
+    assert Pipeline([1, 2, 3]).par_map(square, executor=executor) == (1, 4, 9)
+
+def test_authkey() -> None:
+    with DistributedExecutor() as a, DistributedExecutor() as b:
+        assert len(a.authkey) == 32
+        assert a.authkey != b.authkey
+    with pytest.raises(ValueError):
+        DistributedExecutor(("0.0.0.0", 0))
+    with DistributedExecutor(("0.0.0.0", 0), authkey=b"secret") as executor:
+        assert executor.authkey == b"secret"
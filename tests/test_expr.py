@@ -0,0 +1,80 @@
+from oa_utils import Pipeline, Vector2, Expr, col, attr, it, lit
+from typing import Any
+from typing_extensions import assert_type
+import pickle
+import pytest
+
+people = Pipeline([{'name': 'Alice', 'age': 30}, {'name': 'Bob', 'age': 25}, {'name': 'Eve', 'age': 35}])
+
+def test_col() -> None:
+    p = people.filter(col('age') > 26).map(col('name'))
+    assert p == ('Alice', 'Eve')
+    assert_type(p, Pipeline[Any])
+    assert Pipeline([(1, 2), (3, 4)]).map(col(0) * 10 + col(1)) == (12, 34)
+
+def test_attr() -> None:
+    vectors = Pipeline([Vector2(1.0, 2.0), Vector2(3.0, 0.0)])
+    assert vectors.sort(attr('y')).map(attr('x')) == (3.0, 1.0)
+    with pytest.raises(ValueError):
+        attr('not a name')
+
+def test_it() -> None:
+    assert Pipeline(range(10)).filter((it() % 3 == 0) & ~(it() == 3)) == (0, 6, 9)
+    assert Pipeline([-2, 1]).map(-it() ** 2) == (-4, -1)
+    assert Pipeline([1, 2, 3]).map(1 - it() / 2) == (0.5, 0.0, -0.5)
+    assert Pipeline([0, 1, 2]).map((it() > 1) | (it() < 1)) == (True, False, True)
+
+def test_lit() -> None:
+    assert lit(5)(None) == 5
+    assert lit(col('x')) is not None
+    assert isinstance(lit(col('x')), Expr)
+
+def test_group_by() -> None:
+    groups = people.group_by(col('age') >= 30).map(lambda group: (group[0], group[1].len()))
+    assert groups == ((True, 2), (False, 1))
+
+def test_source() -> None:
+    assert (col('x') * 2 + 1).source() == 'lambda _row: ((_row[_c0] * _c1) + _c2)'
+    assert repr((col('x') > 1) & ~attr('y')) == "((col('x') > lit(1)) & ~attr('y'))"
+
+def test_bool() -> None:
+    with pytest.raises(TypeError):
+        bool(col('x') > 1)
+
+def test_pickle() -> None:
+    expr = (col('age') + 1) * 2
+    assert expr(people[0]) == 62 # Compile before pickling
+    assert pickle.loads(pickle.dumps(expr))(people[1]) == 52
+
+def test_par_map() -> None:
+    assert Pipeline(range(5)).par_map(it() * 2 + 1, processes=2) == (1, 3, 5, 7, 9)
+    assert people.par_filter(col('name') != 'Bob', processes=2) == (people[0], people[2])
+
+def test_evaluate_columns() -> None:
+    columns: dict[str, list[Any]] = {'name': ['Alice', 'Bob'], 'age': [30, 25]}
+    assert (col('age') * 2).evaluate_columns(columns) == [60, 50]
+    assert ((col('age') > 26) & (col('name') != 'Eve')).evaluate_columns(columns) == [True, False]
+    assert lit(1).evaluate_columns(columns) == [1, 1]
+    with pytest.raises(ValueError):
+        it().evaluate_columns(columns)
+
+def test_evaluate_columns_numpy() -> None:
+    np = pytest.importorskip("numpy")
+    columns = {'x': np.array([1.0, 2.0, 3.0]), 'y': np.array([1.5, 0.5, 3.5])}
+    assert (col('x') * 2 + col('y')).evaluate_columns(columns) == [3.5, 4.5, 9.5]
+    assert ((col('x') > 1) & ~(col('y') > 3)).evaluate_columns(columns) == [False, True, False]
+    assert lit(2).evaluate_columns(columns) == [2, 2, 2]
+
+def test_evaluate_columns_large_ints() -> None:
+    # With numpy installed, Python ints must not be converted to (overflowing) int64 arrays
+    pytest.importorskip("numpy")
+    columns = {'x': [3, -7, 2**70], 'y': [0, 2, 5]}
+    for expr in (col('x') ** 40, col('x') // 2 % 5, col('x') * col('y')):
+        rows = [{'x': x, 'y': y} for x, y in zip(columns['x'], columns['y'])]
+        assert expr.evaluate_columns(columns) == [expr(row) for row in rows]
+    with pytest.raises(ZeroDivisionError):
+        (col('x') // col('y')).evaluate_columns(columns)
+
+def test_abstract() -> None:
+    with pytest.raises(TypeError):
+        Expr() # type: ignore
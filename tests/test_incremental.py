@@ -0,0 +1,44 @@
+from oa_utils import Pipeline, IncrementalPipeline, IncrementalResult
+from typing_extensions import assert_type
+import random
+
+def test_sum() -> None:
+    total = IncrementalPipeline(Pipeline([1, 2, 3])).map(lambda x: x * 10).sum()
+    assert total.value == 60
+    assert total.extend([4, 5]).value == 150
+    assert total.append(6).value == 210
+    assert_type(total, IncrementalResult[int, int])
+    assert_type(total.value, int)
+
+def test_len() -> None:
+    count = IncrementalPipeline(['a', 'bb']).filter(lambda s: len(s) > 1).len()
+    assert count.value == 1
+    assert count.extend(['ccc', 'd']).value == 2
+    assert_type(count, IncrementalResult[str, int])
+
+def test_unique() -> None:
+    distinct = IncrementalPipeline([1, 2, 2]).flat_map(lambda x: [x, -x]).unique()
+    assert distinct.value == (1, -1, 2, -2)
+    assert distinct.extend([3, 1]).value == (1, -1, 2, -2, 3, -3)
+    assert_type(distinct.value, Pipeline[int])
+
+def test_group_by() -> None:
+    groups = IncrementalPipeline(['Roger', 'Alice']).group_by(lambda name: name[0])
+    assert groups.value == (('R', ('Roger',)), ('A', ('Alice',)))
+    assert groups.extend(['Adam', 'Bob']).value == (('R', ('Roger',)), ('A', ('Alice', 'Adam')), ('B', ('Bob',)))
+    assert_type(groups.value, Pipeline[tuple[str, Pipeline[str]]])
+
+def test_matches_recomputation() -> None:
+    rng = random.Random(0)
+    source = Pipeline(rng.randrange(100) for _ in range(100))
+    chain = IncrementalPipeline(source).map(lambda x: x * 3).filter(lambda x: x % 2 == 0)
+    groups = chain.group_by(lambda x: x % 7)
+    total = chain.sum()
+    for _ in range(5):
+        delta = [rng.randrange(100) for _ in range(20)]
+        source = source.extend(delta)
+        groups.extend(delta)
+        total.extend(delta)
+        expected = source.map(lambda x: x * 3).filter(lambda x: x % 2 == 0)
+        assert groups.value == expected.group_by(lambda x: x % 7)
+        assert total.value == expected.sum()
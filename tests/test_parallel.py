@@ -0,0 +1,218 @@
+from oa_utils import Pipeline, AutoChunksize, AutoParallel, PoolStats, Speculative, square, swallow
+from operator import add
+from multiprocessing import Pool
+from typing_extensions import assert_type
+from pathlib import Path
+import functools
+import json
+import os
+import pytest
+import time
+
+def slow_add(a: str, b: str) -> str:
+    time.sleep(0.001)
+    return a + b
+
+def test_par_map_auto_chunksize() -> None:
+    p = Pipeline(range(1, 11)).par_map(square, processes=2, chunksize="auto")
+    assert p == (1, 4, 9, 16, 25, 36, 49, 64, 81, 100)
+    assert_type(p, Pipeline[float])
+
+def test_par_zip_with_auto_chunksize() -> None:
+    tuner = AutoChunksize(sample_size=2)
+    p: Pipeline[int] = Pipeline(range(100)).par_zip_with(add, range(100), processes=2, chunksize=tuner)
+    assert p == tuple(range(0, 200, 2))
+    assert_type(p, Pipeline[int])
+    assert sum(tuner.chunksizes) == 98
+    assert tuner.seconds_per_item > 0
+    assert tuner.pickle_bytes_per_item > 0
+
+def test_par_for_each_auto_chunksize() -> None:
+    p = Pipeline(range(1, 11)).par_for_each(swallow, processes=2, chunksize="auto")
+    assert p == (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+    assert_type(p, Pipeline[int])
+
+def test_auto_chunksize_plan() -> None:
+    tuner = AutoChunksize(chunks_per_worker=1)
+    # Expensive elements: guided chunks that shrink as the work runs out
+    tuner.seconds_per_item = 1.0
+    assert tuner.plan(100, 4) == [25, 19, 14, 11, 8, 6, 5, 3, 3, 2, 1, 1, 1, 1]
+    # Cheap elements: at least min_chunk_seconds of work per chunk
+    tuner.seconds_per_item = 0.001
+    assert tuner.plan(100, 4) == [25, 19, 14, 11, 10, 10, 10, 1]
+    # Large elements: at most max_chunk_bytes per chunk
+    tuner.pickle_bytes_per_item = 2**22
+    assert tuner.plan(10, 1) == [4, 4, 2]
+    assert tuner.plan(0, 4) == []
+
+def test_map_parallel_auto() -> None:
+    auto = AutoParallel()
+    p = Pipeline(range(100)).map(lambda x: x + 1, parallel=auto)
+    assert p == tuple(range(1, 101))
+    assert_type(p, Pipeline[int])
+    assert auto.parallel is False
+    assert auto.reason == "fn is not picklable"
+
+    # Expensive elements run in parallel
+    auto = AutoParallel(processes=2, sample_size=2, startup_seconds=0.0)
+    p2 = Pipeline([0.001] * 20).map(time.sleep, parallel=auto)
+    assert p2 == (None,) * 20
+    assert auto.parallel is True
+    assert auto.parallel_seconds < auto.serial_seconds
+
+    # Cheap elements stay serial
+    auto = AutoParallel(processes=2)
+    p3 = Pipeline(range(1, 101)).map(square, parallel=auto)
+    assert p3 == tuple(x * x for x in range(1, 101))
+    assert auto.parallel is False
+
+def test_zip_with_parallel_auto() -> None:
+    auto = AutoParallel(processes=2, sample_size=1, startup_seconds=0.0)
+    p = Pipeline([1, 2, 3]).zip_with(add, [10, 20, 30], parallel=auto)
+    assert p == (11, 22, 33)
+    assert_type(p, Pipeline[int])
+    assert auto.reason
+
+    p = Pipeline([1, 2, 3]).zip_with(add, [10, 20, 30], parallel=True)
+    assert p == (11, 22, 33)
+
+def test_for_each_parallel_auto() -> None:
+    p = Pipeline(range(1, 11)).for_each(swallow, parallel="auto")
+    assert p == (1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+    assert_type(p, Pipeline[int])
+
+def test_reduce_non_empty_parallel_auto() -> None:
+    auto = AutoParallel(processes=2, sample_size=3, startup_seconds=0.0, seconds_per_byte=0.0)
+    res = Pipeline("Parallelism!").reduce_non_empty(slow_add, parallel=auto)
+    assert res == "Parallelism!"
+    assert_type(res, str)
+    assert auto.parallel is True
+
+    res = Pipeline("Parallelism!").reduce_non_empty(add, parallel="auto")
+    assert res == "Parallelism!"
+
+class CountingLookup:
+    """A callable holding a table, counting how many times it's pickled."""
+    pickled = 0
+
+    def __init__(self, table: dict[int, int]) -> None:
+        self.table = table
+
+    def __call__(self, key: int) -> int:
+        return self.table[key]
+
+    def __getstate__(self) -> dict[str, object]:
+        CountingLookup.pickled += 1
+        return self.__dict__
+
+def test_par_map_broadcasts_fn_once_per_worker() -> None:
+    CountingLookup.pickled = 0
+    fn = CountingLookup({x: x * 10 for x in range(100)})
+    p = Pipeline(range(100)).par_map(fn, processes=2, chunksize=1)
+    assert p == tuple(range(0, 1000, 10))
+    assert CountingLookup.pickled <= 2
+
+def logged_square(log_dir: str, fail_on: str, x: int) -> int:
+    """Record that *x* was processed, and fail on 7 while *fail_on* exists."""
+    if x == 7 and os.path.exists(fail_on):
+        raise ValueError(x)
+    open(os.path.join(log_dir, str(x)), "w").close()
+    return x * x
+
+def test_par_map_checkpoint(tmp_path: Path) -> None:
+    log_dir, checkpoint_dir, fail_on = tmp_path / "log", tmp_path / "checkpoints", tmp_path / "fail"
+    log_dir.mkdir()
+    fail_on.touch()
+    fn = functools.partial(logged_square, str(log_dir), str(fail_on))
+    with pytest.raises(ValueError):
+        Pipeline(range(10)).par_map(fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    saved = len(list(checkpoint_dir.glob("chunk-*.pkl")))
+    assert 3 <= saved < 5 # Chunks (0, 1), (2, 3) and (4, 5) finished before (6, 7) failed
+    fail_on.unlink()
+    for path in log_dir.iterdir():
+        path.unlink()
+    p = Pipeline(range(10)).par_map(fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    assert p == (0, 1, 4, 9, 16, 25, 36, 49, 64, 81)
+    assert_type(p, Pipeline[int])
+    assert len(list(checkpoint_dir.glob("chunk-*.pkl"))) == 5
+    assert {int(path.name) for path in log_dir.iterdir()} <= {6, 7, 8, 9}
+    with pytest.raises(ValueError):
+        Pipeline(range(10)).par_map(fn, chunksize="auto", checkpoint_dir=checkpoint_dir)
+    # A different run in the same directory is refused, not mixed with the saved chunks
+    with pytest.raises(ValueError, match="another run"):
+        Pipeline(range(12)).par_map(fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    with pytest.raises(ValueError, match="another run"):
+        Pipeline(range(10)).par_map(square, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    with pytest.raises(ValueError, match="another run"):
+        other_fn = functools.partial(logged_square, str(tmp_path), str(fail_on))
+        Pipeline(range(10)).par_map(other_fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    # New elements of the same length are processed again, not loaded from the old chunks
+    p = Pipeline(range(100, 110)).par_map(fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir)
+    assert p == tuple(x * x for x in range(100, 110))
+    with pytest.raises(ValueError):
+        Pipeline(range(10)).par_map(fn, processes=1, chunksize=2, checkpoint_dir=checkpoint_dir, speculative=True)
+
+def stall_once(n: int, marker: str, x: int) -> int:
+    """Stall on *n* the first time it's seen, like a chunk on an overloaded machine."""
+    if x == n and not os.path.exists(marker):
+        open(marker, "w").close()
+        time.sleep(10)
+    return x * x
+
+def test_par_map_speculative(tmp_path: Path) -> None:
+    scheduler = Speculative()
+    fn = functools.partial(stall_once, 5, str(tmp_path / "stalled"))
+    start = time.perf_counter()
+    p = Pipeline(range(40)).par_map(fn, processes=2, chunksize=2, speculative=scheduler)
+    assert time.perf_counter() - start < 5
+    assert p == tuple(x * x for x in range(40))
+    assert_type(p, Pipeline[int])
+    assert scheduler.speculated >= 1
+    assert scheduler.speculative_wins >= 1
+    assert Pipeline(range(10)).par_map(square, processes=2, speculative=True) == tuple(x * x for x in range(10))
+    with Pool(2) as pool:
+        assert Pipeline(range(10)).par_map(square, speculative=True, executor=pool) == tuple(x * x for x in range(10))
+    with pytest.raises(ValueError):
+        Pipeline(range(10)).par_map(square, processes=2, chunksize="auto", speculative=True)
+    with pytest.raises(ValueError, match="Chunksize"):
+        Pipeline(range(10)).par_map(square, processes=2, chunksize=-2, speculative=True)
+
+def test_par_map_stats(tmp_path: Path) -> None:
+    stats = PoolStats()
+    p = Pipeline(range(100)).par_map(square, processes=2, chunksize=10, stats=stats)
+    assert p == tuple(x * x for x in range(100))
+    assert_type(p, Pipeline[float])
+    Pipeline(range(20)).par_zip_with(add, range(20), processes=2, chunksize=5, stats=stats)
+    assert stats.runs == 2
+    assert stats.tasks == 14
+    assert stats.worker_seconds == pytest.approx(stats.wall_seconds * 2)
+    assert all(worker.bytes_in > 0 and worker.bytes_out > 0 for worker in stats.workers.values())
+    assert 0 < stats.utilization <= 1
+    stats.write(tmp_path / "pool.json")
+    assert json.loads((tmp_path / "pool.json").read_text())["runs"] == 2
+    stats.write(tmp_path / "pool.prom")
+    text = (tmp_path / "pool.prom").read_text()
+    assert "# TYPE oa_utils_pool_worker_tasks_total counter" in text
+    assert "oa_utils_pool_runs_total 2" in text
+    with pytest.raises(ValueError):
+        Pipeline(range(10)).par_map(square, processes=2, chunksize="auto", stats=stats)
+    with pytest.raises(ValueError, match="Chunksize"):
+        Pipeline(range(10)).par_map(square, processes=2, chunksize=-1, stats=stats)
+
+def test_par_map_stats_executor() -> None:
+    stats = PoolStats()
+    with Pool(4) as pool:
+        with pytest.raises(ValueError, match="processes"):
+            Pipeline(range(10)).par_map(square, executor=pool, stats=stats)
+        Pipeline(range(40)).par_for_each(swallow, processes=4, executor=pool, chunksize=1, stats=stats)
+    assert stats.restarts == 0
+    assert stats.worker_seconds == pytest.approx(stats.wall_seconds * 4)
+
+def test_par_map_stats_restarts() -> None:
+    stats = PoolStats()
+    Pipeline(range(10)).par_for_each(swallow, processes=1, maxtasksperchild=1, chunksize=2, stats=stats)
+    assert stats.tasks == 5
+    assert stats.restarts == 4
+    Pipeline(range(10)).par_for_each(swallow, processes=2, chunksize=5, stats=stats)
+    assert stats.worker_seconds > stats.wall_seconds
+    assert 0 < stats.utilization <= 1
@@ -1,12 +1,19 @@
 # C:/Python310/python.exe -m pytest
-from oa_utils import Pipeline, Vector2, unpack, square, swallow, shuffle_batch
-from operator import add
+from oa_utils import Aggregator, Count, Sum, Min, Max, Mean, col, Pipeline, SortedIndex, SortedPipeline, Vector2, unpack, argmin, argmax, square, swallow, is_even, shuffle_batch
+from operator import add, mul, sub
 import itertools
 import more_itertools
 from typing import Literal, Iterable, Callable, Any
 from typing_extensions import assert_type
 import pytest
 import random
+import pickle
+from multiprocessing import Pool
+import copy
+import operator
+import statistics
+import sys
+from oa_utils.memory import deep_sizeof
 
 def test_example_usage() -> None:
     hamming_distance = (
@@ -32,6 +39,12 @@ def test_filter() -> None:
     assert p == (2, 4)
     assert_type(p, Pipeline[int])
 
+def test_par_filter() -> None:
+    p = Pipeline(range(1, 11)).par_filter(is_even, processes=2)
+    assert p == (2, 4, 6, 8, 10)
+    assert_type(p, Pipeline[int])
+    assert p == Pipeline(range(1, 11)).filter(is_even)
+
 def test_zip() -> None:
     p = Pipeline([1, 2]).zip([10, 20])
     assert p == ((1, 10), (2, 20))
@@ -51,6 +64,10 @@ def test_zip_with() -> None:
     p = Pipeline([1, 2]).zip_with(lambda a, b: a + b, [10, 20])
     assert p == (11, 22)
     assert_type(p, Pipeline[int])
+    assert Pipeline([1, 2, 3]).zip_with(add, [10, 20]) == (11, 22)
+    assert Pipeline([1, 2]).zip_with(add, [10, 20], strict=True) == (11, 22)
+    with pytest.raises(ValueError):
+        Pipeline([1, 2, 3]).zip_with(add, [10, 20], strict=True)
 
 def test_par_zip_with() -> None:
     p1: Pipeline[int] = Pipeline([1, 2]).par_zip_with(add , [10, 20], processes=2)
@@ -86,11 +103,69 @@ def test_cartesian_product() -> None:
     p = Pipeline([1, 2]).cartesian_product([10, 20])
     assert p == ((1, 10), (1, 20), (2, 10), (2, 20))
     assert_type(p, Pipeline[tuple[int, int]])
+    with pytest.raises(MemoryError):
+        Pipeline(range(1000)).cartesian_product(range(1000), max_bytes=10**6)
+
+def test_cartesian_product_blocks() -> None:
+    blocks = list(Pipeline([1, 2]).cartesian_product_blocks([10, 20], 3))
+    assert blocks == [((1, 10), (1, 20), (2, 10)), ((2, 20),)]
+    assert_type(blocks, list[Pipeline[tuple[int, int]]])
+    xs, ys = Pipeline(range(7)), range(5)
+    assert Pipeline(xs.cartesian_product_blocks(ys, 4)).flatten() == xs.cartesian_product(ys)
+
+def test_estimate_cartesian_product() -> None:
+    xs, ys = Pipeline(range(1000, 1030)), [object() for _ in range(20)]
+    estimate = xs.estimate_cartesian_product(ys)
+    assert_type(estimate, int)
+    p = xs.cartesian_product(ys, max_bytes=estimate)
+    # The elements are shared with the inputs
+    assert deep_sizeof(p, seen={id(x) for x in (*xs, *ys)}) == estimate
+    # An iterator would be used up by the estimate, so it's rejected
+    with pytest.raises(TypeError):
+        xs.estimate_cartesian_product(iter(ys)) # type: ignore
 
 def test_outer_product() -> None:
     p = Pipeline([1, 2, 3]).outer_product(lambda a, b: a * b, [1, 2, 3])
     assert p == ((1, 2, 3), (2, 4, 6), (3, 6, 9))
     assert_type(p, Pipeline[Pipeline[int]])
+    with pytest.raises(MemoryError):
+        Pipeline(range(1000)).outer_product(add, range(1000), max_bytes=10**6)
+
+def times(a: int, b: int) -> int:
+    return a * b
+
+def test_outer_product_tiles() -> None:
+    xs, ys = Pipeline(range(7)), range(5)
+    tiles = list(xs.outer_product_tiles(times, ys, 3, 2))
+    assert_type(tiles, list[tuple[int, int, Pipeline[Pipeline[int]]]])
+    assert [(i, j) for i, j, _ in tiles] == [(i, j) for i in range(0, 7, 3) for j in range(0, 5, 2)]
+    full = xs.outer_product(times, ys)
+    for i, j, tile in tiles:
+        assert tile == full.slice(i, i + 3).map(lambda row: row.slice(j, j + 2))
+
+def test_par_outer_product() -> None:
+    p = Pipeline(range(10)).par_outer_product(times, range(5), processes=2)
+    assert p == Pipeline(range(10)).outer_product(mul, range(5))
+    assert_type(p, Pipeline[Pipeline[int]])
+
+def test_outer_reduce() -> None:
+    p = Pipeline([1, 5, 9]).outer_reduce(lambda a, b: abs(a - b), [0, 4, 8], argmin)
+    assert p == (0, 1, 2)
+    assert_type(p, Pipeline[int])
+    assert Pipeline([1, 5, 9]).outer_reduce(times, [1, -1], lambda row: min(row)) == (-1, -5, -9)
+    assert Pipeline([1, 5, 9]).outer_reduce(times, [1, -1], argmax) == (0, 0, 0)
+
+def test_par_outer_reduce() -> None:
+    p = Pipeline(range(20)).par_outer_reduce(sub, range(10), argmin, processes=2, chunksize=3)
+    assert p == Pipeline(range(20)).outer_product(sub, range(10)).map(argmin)
+    assert_type(p, Pipeline[int])
+
+def test_estimate_outer_product() -> None:
+    xs, ys = Pipeline(range(1000, 1030)), range(1000, 1020)
+    estimate = xs.estimate_outer_product(lambda a, b: str(a * b), ys) # Every product has 7 digits
+    assert_type(estimate, int)
+    p = xs.outer_product(lambda a, b: str(a * b), ys, max_bytes=estimate)
+    assert deep_sizeof(p) == estimate
 
 def test_sort_no_reverse() -> None:
     p = Pipeline([3, 1, 2]).sort()
@@ -102,16 +177,159 @@ def test_sort_reverse() -> None:
     assert p == (3, 2, 1)
     assert_type(p, Pipeline[int])
 
+def test_sort_remember() -> None:
+    p = Pipeline([3, 1, 2]).sort(remember=True)
+    assert_type(p, SortedPipeline[int])
+    assert (p.key, p.descending) == (None, False)
+    assert pickle.loads(pickle.dumps(p)).descending is False
+    assert p == (1, 2, 3)
+    words = Pipeline(['Bob', 'Alice', 'Al']).sort(len, reverse=True, remember=True)
+    assert (words.key, words.descending) == (len, True)
+    assert words == ('Alice', 'Bob', 'Al')
+
+@pytest.mark.parametrize("copy_fn", [lambda p: pickle.loads(pickle.dumps(p)), copy.copy, copy.deepcopy])
+def test_sorted_pipeline_copy(copy_fn: Callable[[Any], Any]) -> None:
+    words = copy_fn(Pipeline(['Bob', 'Alice', 'Al']).sort(len, remember=True))
+    assert type(words) is SortedPipeline
+    assert tuple(words) == ('Al', 'Bob', 'Alice')
+    assert (words.key, words.descending) == (len, False)
+    assert words.find(3) == ('Bob',)
+    numbers = copy_fn(Pipeline([1, 3, 2]).sort(reverse=True, remember=True))
+    assert tuple(numbers) == (3, 2, 1)
+    assert numbers.descending is True
+    assert numbers.max() == 3 and 3 in numbers
+    # Elements that can't be compared to each other
+    people = copy_fn(Pipeline([{'age': 30}, {'age': 25}]).sort(operator.itemgetter('age'), remember=True))
+    assert tuple(people) == ({'age': 25}, {'age': 30})
+
+def test_sorted_pipeline_find() -> None:
+    random.seed(0)
+    items = Pipeline(random.choices(range(20), k=100))
+    for reverse in (False, True):
+        for key in (None, lambda x: x // 3):
+            p = items.sort(key, reverse, remember=True)
+            for k in range(-1, 21):
+                expected = p.filter(lambda x: (x if key is None else key(x)) == k)
+                assert p.find(k) == expected
+                assert (k in p) == (k in items)
+    assert 'a' not in Pipeline[object]([1, 2]).sort(remember=True)
+    rows = Pipeline([{'a': 2}, {'a': 1}]).sort(col('a'), remember=True)
+    assert {'a': 1} in rows
+    assert {'b': 1} not in rows
+    assert (1,) not in Pipeline[tuple[int, ...]]([(1, 2)]).sort(operator.itemgetter(1), remember=True)
+
+def test_sorted_pipeline_min_max() -> None:
+    for reverse in (False, True):
+        p = Pipeline([3, 1, 2]).sort(reverse=reverse, remember=True)
+        assert (p.min(), p.max()) == (1, 3)
+    keyed = Pipeline([3, 1, 2]).sort(lambda x: -x, remember=True)
+    assert (keyed.min(), keyed.max()) == (1, 3)
+    with pytest.raises(ValueError):
+        Pipeline[int]().sort(remember=True).min()
+
+def test_sorted_pipeline_unique() -> None:
+    p = Pipeline([2, 1, 2, 3, 1]).sort(reverse=True, remember=True).unique()
+    assert p == (3, 2, 1)
+    assert isinstance(p, SortedPipeline)
+    assert Pipeline(['ab', 'cd', 'ab']).sort(len, remember=True).unique() == ('ab', 'cd')
+
+def test_sorted_pipeline_group_by() -> None:
+    p = Pipeline(['Bob', 'Al', 'Alice', 'Ed']).sort(len, remember=True)
+    assert p.group_by(len) == ((2, ('Al', 'Ed')), (3, ('Bob',)), (5, ('Alice',)))
+    assert p.group_by(lambda name: name[0]) == (('A', ('Al', 'Alice')), ('E', ('Ed',)), ('B', ('Bob',)))
+
+def test_sorted_pipeline_merge() -> None:
+    a = Pipeline([5, 1, 3]).sort(reverse=True, remember=True)
+    b = Pipeline([2, 6]).sort(reverse=True, remember=True)
+    p = a.merge(b)
+    assert p == (6, 5, 3, 2, 1)
+    assert_type(p, SortedPipeline[int])
+    with pytest.raises(ValueError):
+        a.merge(Pipeline([2, 6]).sort(remember=True))
+
 def test_unique() -> None:
     p = Pipeline([1, 2, 2, 3]).unique()
     assert p == (1, 2, 3)
     assert_type(p, Pipeline[int])
 
+def test_par_unique() -> None:
+    p = Pipeline([3, 1, 2, 2, 3, 'a', 1, 'a']).par_unique(processes=2)
+    assert p == (3, 1, 2, 'a')
+    assert_type(p, Pipeline[int | str])
+
+    items = Pipeline(random.Random(0).choices(range(50), k=500))
+    assert items.par_unique(processes=3) == items.unique()
+
+def test_intersect() -> None:
+    p = Pipeline([3, 1, 2, 1]).intersect([1, 3, 5])
+    assert p == (3, 1)
+    assert_type(p, Pipeline[int])
+    assert Pipeline(['a', 'B', 'b']).intersect(['A'], key=str.lower) == ('a',)
+
+def test_difference() -> None:
+    p = Pipeline([3, 1, 2, 1]).difference([1, 5])
+    assert p == (3, 2)
+    assert_type(p, Pipeline[int])
+    assert Pipeline(['a', 'B', 'b']).difference(['A'], key=str.lower) == ('B',)
+
+def test_union() -> None:
+    p = Pipeline([3, 1, 1]).union(['x', 3])
+    assert p == (3, 1, 'x')
+    assert_type(p, Pipeline[int | str])
+    assert Pipeline([[1], [1, 2]]).union([[3], [2, 1]], key=len, assume_sorted=True) == ([1], [1, 2])
+
+def test_symmetric_difference() -> None:
+    p = Pipeline([3, 1, 2]).symmetric_difference([2, 5, 1, 4])
+    assert p == (3, 5, 4)
+    assert_type(p, Pipeline[int])
+
+@pytest.mark.parametrize("method", ["intersect", "difference", "union", "symmetric_difference"])
+def test_set_operations_match_sets(method: str) -> None:
+    random.seed(method)
+    xs = Pipeline(random.choices(range(50), k=100))
+    ys = Pipeline(random.choices(range(25, 75), k=100))
+    expected = getattr(set(xs), method.replace("intersect", "intersection"))(set(ys))
+    hashed = getattr(xs, method)(ys)
+    assert set(hashed) == expected and len(hashed) == len(expected)
+    assert getattr(xs, method)(ys, parallel=True, processes=3) == hashed
+    assert getattr(xs.sort(), method)(ys.sort(), assume_sorted=True) == tuple(sorted(expected))
+
+def test_partition_by() -> None:
+    p = Pipeline(range(10)).partition_by(lambda x: x % 3, 3)
+    assert p == ((0, 3, 6, 9), (1, 4, 7), (2, 5, 8))
+    assert_type(p, Pipeline[Pipeline[int]])
+    words = Pipeline(['a', 'bb', 'c', 'dd', 'e']).partition_by(len, 4)
+    assert len(words) == 4
+    assert sorted(words.filter(bool)) == [('a', 'c', 'e'), ('bb', 'dd')]
+    for n in (0, -2):
+        with pytest.raises(ValueError):
+            Pipeline(range(10)).partition_by(lambda x: x % 3, n)
+
+def test_partition_by_range() -> None:
+    p = Pipeline([5, 25, 1, 10, 30, 20]).partition_by_range(lambda x: x, [10, 20])
+    assert p == ((5, 1), (10,), (25, 30, 20))
+    assert_type(p, Pipeline[Pipeline[int]])
+    assert Pipeline([1, 2]).partition_by_range(lambda x: x, []) == ((1, 2),)
+
+def test_par_map_partitions() -> None:
+    names = Pipeline(['Bob', 'Al', 'Alice', 'Ed', 'Eve', 'Roger'] * 10)
+    p = names.par_map_partitions(Pipeline.unique, len, processes=3)
+    assert sorted(p) == sorted(names.unique())
+    assert_type(p, Pipeline[str])
+
 def test_slice() -> None:
     p = Pipeline([1, 2, 3, 4, 5]).slice(1, 4)
     assert p == (2, 3, 4)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([1, 2, 3, 4, 5]).slice(0, 5, 2)
+    assert p == (1, 3, 5)
+    assert_type(p, Pipeline[int])
+
+    # Slicing the whole pipeline shares it instead of copying
+    p = Pipeline([1, 2, 3])
+    assert p.slice() is p
+
 def test_take() -> None:
     p = Pipeline([1, 2, 3, 4]).take(2)
     assert p == (1, 2)
@@ -121,6 +339,9 @@ def test_take() -> None:
     assert p == (1, 2, 3)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([1, 2, 3, 4])
+    assert p.take(10) is p
+
 def test_drop() -> None:
     p = Pipeline([1, 2, 3, 4]).drop(2)
     assert p == (3, 4)
@@ -130,6 +351,9 @@ def test_drop() -> None:
     assert p == (2, 3, 4)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([1, 2, 3, 4])
+    assert p.drop(0) is p
+
 def test_enumerate() -> None:
     p = Pipeline(['a', 'b']).enumerate()
     assert p == ((0, 'a'), (1, 'b'))
@@ -139,16 +363,68 @@ def test_batch() -> None:
     p = Pipeline(range(1, 6)).batch(2)
     assert p == ((1, 2), (3, 4), (5,))
     assert_type(p, Pipeline[Pipeline[int]])
+    assert all(type(batch) is Pipeline for batch in p)
+    assert Pipeline(range(4)).batch(2, strict=True) == ((0, 1), (2, 3))
+    assert Pipeline([]).batch(2) == ()
+    with pytest.raises(ValueError):
+        Pipeline(range(5)).batch(2, strict=True)
 
 def test_batch_fill() -> None:
     p = Pipeline(range(1, 6)).batch_fill(2, fillvalue=0)
     assert p == ((1, 2), (3, 4), (5, 0))
     assert_type(p, Pipeline[Pipeline[int]])
 
+def test_sliding_window() -> None:
+    p = Pipeline(range(1, 6)).sliding_window(3)
+    assert p == ((1, 2, 3), (2, 3, 4), (3, 4, 5))
+    assert_type(p, Pipeline[Pipeline[int]])
+
+    p = Pipeline(range(1, 8)).sliding_window(2, step=3)
+    assert p == ((1, 2), (4, 5))
+
+    assert Pipeline([1, 2]).sliding_window(3) == ()
+
+    with pytest.raises(ValueError):
+        Pipeline([1, 2]).sliding_window(0)
+
+def test_rolling() -> None:
+    values = Pipeline([random.Random(0).uniform(-100, 100) for _ in range(200)])
+    windows = values.sliding_window(7)
+    assert values.rolling(7, 'sum') == pytest.approx(windows.map(sum))
+    assert values.rolling(7, 'mean') == pytest.approx(windows.map(lambda w: w.avg()))
+    assert values.rolling(7, 'min') == windows.map(min)
+    assert values.rolling(7, 'max') == windows.map(max)
+    assert values.rolling(7, 'var') == pytest.approx(windows.map(statistics.variance))
+
+    p1 = Pipeline([1, 3, 2, 5, 4]).rolling(3, 'sum')
+    assert p1 == (6, 10, 11)
+    assert_type(p1, Pipeline[int])
+
+    p2 = Pipeline([1, 3, 2, 5, 4]).rolling(2, 'mean')
+    assert p2 == (2.0, 2.5, 3.5, 4.5)
+    assert_type(p2, Pipeline[float])
+
+    p3 = Pipeline([1, 3, 2, 5, 4]).rolling(3, lambda window: window.to_str())
+    assert p3 == ('132', '325', '254')
+    assert_type(p3, Pipeline[str])
+
+    assert Pipeline([1, 2]).rolling(3, 'min') == ()
+
+    with pytest.raises(ValueError):
+        Pipeline([1, 2]).rolling(1, 'var')
+
 def test_flatten() -> None:
     p = Pipeline([[1, 2], [3, 4]]).flatten()
     assert p == (1, 2, 3, 4)
     assert_type(p, Pipeline[int])
+    with pytest.raises(ValueError):
+        Pipeline([[1, 2], 3]).flatten() # type: ignore
+    def fail() -> Iterable[int]:
+        raise TypeError("from inside an element")
+        yield 1
+    # A TypeError raised while iterating an element isn't mistaken for a non-iterable element
+    with pytest.raises(TypeError, match="from inside"):
+        Pipeline([[1], fail()]).flatten()
 
 def test_flatmap() -> None:
     p1 = Pipeline([1, 2, 3]).flat_map(lambda x: [x] * 2)
@@ -159,6 +435,29 @@ def test_flatmap() -> None:
     assert p2 == (0, 0, 1, 0, 1, 2)
     assert_type(p2, Pipeline[int])    
 
+def test_par_flat_map() -> None:
+    p = Pipeline([1, 2, 3]).par_flat_map(range, processes=2)
+    assert p == (0, 0, 1, 0, 1, 2)
+    assert_type(p, Pipeline[int])
+
+def test_map_batches() -> None:
+    p = Pipeline([3, 1, 2, 6, 5, 4, 7]).map_batches(lambda batch: batch.sort(), 3)
+    assert p == (1, 2, 3, 4, 5, 6, 7)
+    assert_type(p, Pipeline[int])
+
+    p2 = Pipeline(range(5)).map_batches(lambda batch: [batch.sum()], 2)
+    assert p2 == (1, 5, 4)
+    assert_type(p2, Pipeline[int])
+
+def test_par_map_batches() -> None:
+    sort: Callable[[Pipeline[int]], list[int]] = sorted
+    p = Pipeline([3, 1, 2, 6, 5, 4, 7]).par_map_batches(sort, 3, processes=2)
+    assert p == (1, 2, 3, 4, 5, 6, 7)
+    assert_type(p, Pipeline[int])
+
+    p2 = Pipeline([3, 1, 2, 6, 5, 4]).par_map_batches(reversed, 2, processes=2)
+    assert p2 == (1, 3, 6, 2, 4, 5)
+
 def test_for_each() -> None:
     # Not testing the printed output, but ensuring it returns the pipeline.
     p = Pipeline([1, 2, 3]).for_each(print)
@@ -195,6 +494,18 @@ def test_transpose() -> None:
     p2 = Pipeline([[1, 2, 3], [4, 5, 6]]).transpose()
     assert p2 == ((1, 4), (2, 5), (3, 6))
     assert_type(p2, Pipeline[Pipeline[int]])
+    with pytest.raises(MemoryError):
+        Pipeline([range(1000)] * 1000).transpose(max_bytes=10**6)
+
+def test_estimate_transpose() -> None:
+    rows = Pipeline([[object() for _ in range(30)] for _ in range(20)])
+    estimate = rows.estimate_transpose()
+    assert_type(estimate, int)
+    elements = {id(x) for row in rows for x in row}
+    assert deep_sizeof(rows.transpose(max_bytes=estimate), seen=elements) == estimate
+    assert Pipeline[list[int]]().estimate_transpose() == sys.getsizeof(Pipeline())
+    with pytest.raises(TypeError):
+        Pipeline([iter([1, 2])]).estimate_transpose()
 
 def test_print() -> None:
     # We can’t check printed text easily, but can check it returns the pipeline.
@@ -239,16 +550,31 @@ def test_extend() -> None:
     assert p == (1, 2, 3, 4)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([1, 2]).extend([3], (4, 5), range(6, 8))
+    assert p == (1, 2, 3, 4, 5, 6, 7)
+    assert_type(p, Pipeline[int])
+
 def test_insert_at() -> None:
     p = Pipeline([1, 2, 5]).insert_at(2, [3, 4])
     assert p == (1, 2, 3, 4, 5)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([1, 2, 5]).insert_at(-1, [3, 4])
+    assert p == (1, 2, 3, 4, 5)
+    assert_type(p, Pipeline[int])
+
+    p = Pipeline([1, 2]).insert_at(10, [3])
+    assert p == (1, 2, 3)
+    assert_type(p, Pipeline[int])
+
 def test_reverse() -> None:
     p = Pipeline([1, 2, 3]).reverse()
     assert p == (3, 2, 1)
     assert_type(p, Pipeline[int])
 
+    p = Pipeline([]).reverse()
+    assert p == ()
+
 def test_group_by() -> None:
     p1 = Pipeline([1, 2, 3, 4, 5, 6]).group_by(lambda x: x % 2 == 0)
     assert p1 == ((False, (1, 3, 5)), (True, (2, 4, 6)))
@@ -288,6 +614,32 @@ def test_get_group() -> None:
     with pytest.raises(KeyError):
         grouped.to_dict()['Z']
 
+def test_index_by() -> None:
+    people = [{'id': 1, 'name': 'Roger'}, {'id': 2, 'name': 'Alice'}, {'id': 3, 'name': 'Adam'}]
+    by_id = Pipeline(people).index_by(lambda person: person['id'], unique=True)
+    assert by_id[2] == {'id': 2, 'name': 'Alice'}
+    assert_type(by_id, dict[object, dict[str, object]])
+
+    by_initial = Pipeline(['Roger', 'Alice', 'Adam']).index_by(lambda name: name[0])
+    assert by_initial == {'R': ('Roger',), 'A': ('Alice', 'Adam')}
+    assert_type(by_initial, dict[str, Pipeline[str]])
+
+    with pytest.raises(ValueError):
+        Pipeline(['Alice', 'Adam']).index_by(lambda name: name[0], unique=True)
+
+def test_sorted_index() -> None:
+    index = Pipeline([5, 1, 4, 2, 3, 4]).sorted_index(lambda x: x)
+    assert index.between(2, 4) == (2, 3, 4, 4)
+    assert index.eq(4) == (4, 4)
+    assert index.lt(3) == (1, 2)
+    assert index.le(3) == (1, 2, 3)
+    assert index.gt(4) == (5,)
+    assert index.ge(4) == (4, 4, 5)
+    assert index.between(4, 2) == ()
+    assert len(index) == 6
+    assert_type(index, SortedIndex[int])
+    assert_type(index.between(2, 4), Pipeline[int])
+
 def test_sample() -> None:
     random.seed(1234) 
     p = Pipeline([1, 2, 3, 4, 5]).sample(3)
@@ -298,7 +650,59 @@ def test_shuffle() -> None:
     random.seed(1234) 
     p = Pipeline([1, 2, 3, 4, 5]).shuffle()
     assert p == (4, 1, 5, 3, 2)
-    assert_type(p, Pipeline[int])  
+    assert_type(p, Pipeline[int])
+
+def test_sample_seeded() -> None:
+    state = random.getstate()
+    p = Pipeline(range(20)).sample(5, seed=7)
+    assert p == Pipeline(range(20)).sample(5, seed=7)
+    assert random.getstate() == state
+    assert_type(p, Pipeline[int])
+    assert Pipeline(range(20)).shuffle(seed=7).sort() == tuple(range(20))
+    weighted = Pipeline('abcd').sample(2, seed=7, weights=[0, 1, 0, 1])
+    assert sorted(weighted) == ['b', 'd']
+    with pytest.raises(ValueError):
+        Pipeline('abcd').sample(3, seed=7, weights=[0, 1, 0, 1])
+    with pytest.raises(ValueError):
+        Pipeline('abcd').sample(1, weights=[1, 1])
+
+def test_par_shuffle() -> None:
+    p = Pipeline(range(100)).par_shuffle(seed=7, block=8, processes=2)
+    assert p == Pipeline(range(100)).par_shuffle(seed=7, block=8, processes=1)
+    assert p != tuple(range(100))
+    assert p.sort() == tuple(range(100))
+    assert_type(p, Pipeline[int])
+    assert Pipeline([]).par_shuffle(processes=2) == ()
+    with pytest.raises(ValueError, match="Block size"):
+        Pipeline(range(10)).par_shuffle(block=0, processes=2)
+
+def test_par_sample() -> None:
+    p = Pipeline(range(100)).par_sample(10, seed=7, block=8, processes=2)
+    assert p == Pipeline(range(100)).par_sample(10, seed=7, block=8, processes=1)
+    assert len(set(p)) == 10
+    assert_type(p, Pipeline[int])
+    weights = [1.0 if x % 10 == 0 else 0.0 for x in range(100)]
+    assert Pipeline(range(100)).par_sample(10, seed=7, weights=weights, block=8, processes=2).sort() == tuple(range(0, 100, 10))
+    with pytest.raises(ValueError):
+        Pipeline(range(100)).par_sample(11, seed=7, weights=weights, processes=2)
+    with pytest.raises(ValueError, match="larger than population"):
+        Pipeline(range(5)).par_sample(6, seed=7, processes=2)
+    with pytest.raises(ValueError, match="larger than population"):
+        Pipeline(range(5)).par_sample(-1, seed=7, processes=2)
+    with pytest.raises(ValueError, match="Block size"):
+        Pipeline(range(5)).par_sample(2, block=-1, processes=2)
+
+def test_reservoir_sample() -> None:
+    p = Pipeline.reservoir_sample((x for x in range(1000)), 5, seed=7)
+    assert p == Pipeline.reservoir_sample((x for x in range(1000)), 5, seed=7)
+    assert len(set(p)) == 5
+    assert_type(p, Pipeline[int])
+    assert Pipeline.reservoir_sample(iter('ab'), 5, seed=7).sort() == ('a', 'b')
+    heavy = Pipeline.reservoir_sample(iter(range(100)), 3, seed=7, weight=lambda x: float(x >= 97))
+    assert heavy.sort() == (97, 98, 99)
+    # Every element is equally likely to be picked
+    picks = Pipeline(range(2000)).flat_map(lambda seed: Pipeline.reservoir_sample(iter(range(4)), 1, seed=seed))
+    assert all(400 < picks.filter(lambda x: x == i).len() < 600 for i in range(4))
 
 def test_unpack_filter() -> None:
     names = ['Roger', 'Alice', 'Adam', 'Bob']
@@ -375,11 +779,44 @@ def test_par_reduce_non_empty() -> None:
     assert res == "Parallelism!"
     assert_type(res, str)
 
+def test_scan() -> None:
+    p = Pipeline([104, 101, 108]).scan(lambda acc, x: acc + chr(x), "")
+    assert p == ("", "h", "he", "hel")
+    assert_type(p, Pipeline[str])
+    assert Pipeline([]).scan(add, 0) == (0,)
+
+def test_par_scan() -> None:
+    # Associative but not commutative, so the blocks must be combined in order
+    p = Pipeline("Parallelism!").par_scan(add, processes=2, chunksize=5)
+    assert p == Pipeline("Parallelism!").apply(itertools.accumulate)
+    assert_type(p, Pipeline[str])
+    for chunksize in (None, 1, 7, 100):
+        assert Pipeline(range(100)).par_scan(add, processes=2, chunksize=chunksize) == tuple(itertools.accumulate(range(100)))
+    assert Pipeline([]).par_scan(add, processes=2) == ()
+    for chunksize in (0, -1):
+        with pytest.raises(ValueError, match="Chunksize"):
+            Pipeline(range(10)).par_scan(add, processes=2, chunksize=chunksize)
+    with Pool(2) as pool:
+        assert Pipeline(range(10)).par_scan(add, chunksize=3, executor=pool) == tuple(itertools.accumulate(range(10)))
+        with pytest.raises(ValueError):
+            Pipeline(range(10)).par_scan(add, executor=pool)
+
 def test_len() -> None:
     p = Pipeline([1, 2, 3]).len()
     assert p == 3
     assert_type(p, int)
 
+def test_memory_usage() -> None:
+    shared = "x" * 1000
+    p = Pipeline([shared, shared, shared])
+    assert_type(p.memory_usage(), int)
+    assert p.memory_usage() == sys.getsizeof(p)
+    assert p.memory_usage(deep=True) == sys.getsizeof(p) + sys.getsizeof(shared)
+    groups = Pipeline(range(100)).group_by(is_even)
+    nested = sum(sys.getsizeof(pair) + sys.getsizeof(subgroup) for pair in groups for subgroup in pair[1:])
+    numbers = sum(sys.getsizeof(x) for x in range(100)) + sys.getsizeof(True) + sys.getsizeof(False)
+    assert groups.memory_usage(deep=True) == sys.getsizeof(groups) + nested + numbers
+
 def test_min() -> None:
     p = Pipeline([3, 1, 2]).min()
     assert p == 1
@@ -400,6 +837,42 @@ def test_avg() -> None:
     assert p == 2.0
     assert_type(p, float)
 
+def test_aggregate() -> None:
+    p = Pipeline([3, 1, 2]).aggregate(n="count", total="sum", lo="min", hi="max", mean="avg")
+    assert p == {'n': 3, 'total': 6, 'lo': 1, 'hi': 3, 'mean': 2.0}
+    assert_type(p, dict[str, Any])
+    assert Pipeline[int]().aggregate(n=Count(), total=Sum(), lo=Min(), hi=Max(), mean=Mean()) == \
+        {'n': 0, 'total': 0, 'lo': None, 'hi': None, 'mean': None}
+    rows = Pipeline([{'price': 2.5}, {'price': 1.5}])
+    assert rows.aggregate(total=Sum(col('price')), hi=Max(col('price'))) == {'total': 4.0, 'hi': 2.5}
+    with pytest.raises(ValueError):
+        Pipeline([1]).aggregate(x="median")
+    with pytest.raises(ValueError, match="'by'"):
+        Pipeline([1]).aggregate(**{'by': "count"}) # type: ignore[call-overload]
+    with pytest.raises(TypeError):
+        Aggregator() # type: ignore
+
+def test_aggregate_by() -> None:
+    p = Pipeline(['Alice', 'Bob', 'Al']).aggregate(by=lambda name: name[0], n="count", longest=Max(len))
+    assert p == {'A': {'n': 2, 'longest': 5}, 'B': {'n': 1, 'longest': 3}}
+    assert_type(p, dict[str, dict[str, Any]])
+
+def test_par_aggregate() -> None:
+    random.seed(0)
+    items = Pipeline(random.choices(range(1000), k=500))
+    p = items.par_aggregate(processes=2, chunksize=30, n="count", total="sum", lo="min", hi="max", mean="mean")
+    assert p == items.aggregate(n="count", total="sum", lo="min", hi="max", mean="mean")
+    assert_type(p, dict[str, Any])
+    grouped = items.par_aggregate(by=is_even, processes=3, n="count", lo="min")
+    assert grouped == items.aggregate(by=is_even, n="count", lo="min")
+    assert list(grouped) == [items[0] % 2 == 0, items[0] % 2 == 1]
+    assert_type(grouped, dict[bool, dict[str, Any]])
+    assert Pipeline[int]().par_aggregate(processes=2, n="count") == {'n': 0}
+    with pytest.raises(ValueError, match="'chunksize'"):
+        items.par_aggregate(processes=2, **{'chunksize': Sum()}) # type: ignore[call-overload]
+    with pytest.raises(ValueError, match="Chunksize"):
+        items.par_aggregate(processes=2, chunksize=-3, total="sum")
+
 def test_any_true() -> None:
     p = Pipeline([False, False, True]).any()
     assert p is True
@@ -452,6 +925,10 @@ def test_unzip() -> None:
     assert values == (('Alice',), ('Bob',), ('Charlie',))
     assert_type(keys, Pipeline[str])
     assert_type(values, Pipeline[Pipeline[str]])
+
+    assert Pipeline[tuple[int, int]]().unzip() == ((), ())
+    # Longer rows give their first two columns, as they always have
+    assert Pipeline([(1, 2, 3), (4, 5, 6)]).unzip() == ((1, 4), (2, 5)) # type: ignore
     
 def test__add__() -> None:
     p = Pipeline([1, 2, 3]) + [4, 5, 6]